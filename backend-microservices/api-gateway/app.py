@@ -1,8 +1,10 @@
 from fastapi import FastAPI, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse, JSONResponse, Response
+from starlette.background import BackgroundTask
 import httpx
-from typing import Optional
+from typing import Dict, Optional
+import importlib.util
 import os
 from dotenv import load_dotenv
 
@@ -33,155 +35,261 @@ SERVICES = {
     "reports": os.getenv("REPORTS_SERVICE_URL", "http://localhost:8103")
 }
 
-async def proxy_request(service_url: str, path: str, request: Request):
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        try:
-            headers = dict(request.headers)
-            headers.pop("host", None)
-            
-            url = f"{service_url}{path}"
-            print(f"[Gateway] {request.method} {url}")
-            
-            if request.method == "OPTIONS":
-                # Preflight CORS request: respond OK and let CORSMiddleware append headers
-                return JSONResponse(content={}, status_code=200)
-            elif request.method == "GET":
-                response = await client.get(url, headers=headers, params=request.query_params)
-            elif request.method == "POST":
-                body = await request.body()
-                print(f"[Gateway] Body length: {len(body)}")
-                response = await client.post(url, headers=headers, content=body)
-            elif request.method == "PUT":
-                body = await request.body()
-                response = await client.put(url, headers=headers, content=body)
-            elif request.method == "DELETE":
-                response = await client.delete(url, headers=headers)
-            else:
-                raise HTTPException(status_code=405, detail="Método no permitido")
-            
-            content_type = response.headers.get("content-type", "")
-            
-            # Manejar CSV
-            if content_type.startswith("text/csv"):
-                return StreamingResponse(
-                    iter([response.content]),
-                    media_type="text/csv",
-                    headers=dict(response.headers)
-                )
-            
-            # Manejar PDF
-            if content_type.startswith("application/pdf"):
-                return Response(
-                    content=response.content,
-                    media_type="application/pdf",
-                    headers={
-                        "Content-Disposition": response.headers.get("content-disposition", "attachment; filename=reporte.pdf")
-                    }
-                )
-            
-            # Manejar imágenes
-            if content_type.startswith("image/"):
-                return Response(
-                    content=response.content,
-                    media_type=content_type,
-                    headers={
-                        "Cache-Control": "public, max-age=31536000"
-                    }
-                )
-            
-            # Intentar parsear JSON, si falla devolver contenido raw
-            try:
-                content = response.json() if response.text else {}
-            except Exception:
-                content = {"detail": response.text or "Sin contenido"}
-            
-            # Filtrar headers problemáticos
-            response_headers = dict(response.headers)
-            response_headers.pop("content-length", None)
-            response_headers.pop("content-encoding", None)
-            response_headers.pop("transfer-encoding", None)
-            
-            return JSONResponse(
-                content=content,
-                status_code=response.status_code
+# Timeouts por servicio (segundos); el de conexión es común a todos
+SERVICE_TIMEOUTS = {
+    "users": float(os.getenv("USERS_SERVICE_TIMEOUT", "30")),
+    "events": float(os.getenv("EVENTS_SERVICE_TIMEOUT", "30")),
+    "reports": float(os.getenv("REPORTS_SERVICE_TIMEOUT", "30"))
+}
+CONNECT_TIMEOUT = float(os.getenv("GATEWAY_CONNECT_TIMEOUT", "5"))
+
+# Límites del pool de conexiones keep-alive de cada cliente
+POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("GATEWAY_MAX_CONNECTIONS", "100")),
+    max_keepalive_connections=int(os.getenv("GATEWAY_MAX_KEEPALIVE_CONNECTIONS", "20")),
+    keepalive_expiry=float(os.getenv("GATEWAY_KEEPALIVE_EXPIRY", "30"))
+)
+
+# HTTP/2 solo si el paquete h2 está instalado (httpx[http2])
+HTTP2_ENABLED = os.getenv("GATEWAY_HTTP2", "true").lower() == "true" and importlib.util.find_spec("h2") is not None
+
+# Modo de proxy: "stream" pasa los cuerpos por bloques sin bufferizar,
+# "buffered" conserva el comportamiento anterior (lee todo y re-serializa JSON)
+PROXY_MODE = os.getenv("GATEWAY_PROXY_MODE", "stream").lower()
+
+# Headers hop-by-hop que no deben reenviarse entre conexiones (RFC 7230)
+HOP_BY_HOP_HEADERS = {
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailers", "transfer-encoding", "upgrade"
+}
+# Headers de respuesta que uvicorn agrega por su cuenta (se duplicarían)
+SERVER_HEADERS = {"date", "server"}
+
+# Las imágenes de eventos no cambian de URL: cache de larga duración en el navegador
+IMAGE_CACHE_CONTROL = "public, max-age=31536000"
+
+# Un cliente persistente por servicio: reutiliza conexiones TCP/TLS entre peticiones
+clients: Dict[str, httpx.AsyncClient] = {}
+
+def create_client(service_name: str) -> httpx.AsyncClient:
+    """Crea el cliente HTTP con pool de conexiones para un servicio."""
+    timeout = SERVICE_TIMEOUTS.get(service_name, 30.0)
+    return httpx.AsyncClient(
+        base_url=SERVICES[service_name],
+        timeout=httpx.Timeout(timeout, connect=min(CONNECT_TIMEOUT, timeout)),
+        limits=POOL_LIMITS,
+        http2=HTTP2_ENABLED
+    )
+
+def get_client(service_name: str) -> httpx.AsyncClient:
+    """Devuelve el cliente del servicio, creándolo si el startup aún no corrió."""
+    client = clients.get(service_name)
+    if client is None or client.is_closed:
+        client = create_client(service_name)
+        clients[service_name] = client
+    return client
+
+@app.on_event("startup")
+async def startup_clients():
+    for service_name in SERVICES:
+        get_client(service_name)
+    print(f"[Gateway] Clientes HTTP listos (http2={HTTP2_ENABLED}, max_connections={POOL_LIMITS.max_connections})")
+
+@app.on_event("shutdown")
+async def shutdown_clients():
+    for client in clients.values():
+        await client.aclose()
+    clients.clear()
+
+async def stream_proxy_request(client: httpx.AsyncClient, url: str, headers: dict, request: Request):
+    """Reenvía la petición y la respuesta por bloques, sin cargar los cuerpos en memoria.
+
+    Status, content-type y content-encoding se devuelven tal cual los envía el servicio.
+    """
+    headers = {k: v for k, v in headers.items() if k.lower() not in HOP_BY_HOP_HEADERS}
+    has_body = "content-length" in request.headers or "transfer-encoding" in request.headers
+    upstream_request = client.build_request(
+        request.method,
+        url,
+        headers=headers,
+        params=request.query_params,
+        content=request.stream() if has_body else None
+    )
+    response = await client.send(upstream_request, stream=True)
+    
+    proxied = StreamingResponse(
+        response.aiter_raw(),
+        status_code=response.status_code,
+        background=BackgroundTask(response.aclose)
+    )
+    is_image = response.headers.get("content-type", "").startswith("image/")
+    # raw_headers conserva headers repetidos (p.ej. set-cookie)
+    proxied.raw_headers = [
+        (name.encode("latin-1"), value.encode("latin-1"))
+        for name, value in response.headers.multi_items()
+        if name.lower() not in HOP_BY_HOP_HEADERS
+        and name.lower() not in SERVER_HEADERS
+        and not (is_image and name.lower() == "cache-control")
+    ]
+    if is_image:
+        proxied.raw_headers.append((b"cache-control", IMAGE_CACHE_CONTROL.encode("latin-1")))
+    return proxied
+
+async def proxy_request(service_name: str, path: str, request: Request):
+    client = get_client(service_name)
+    try:
+        headers = dict(request.headers)
+        headers.pop("host", None)
+        
+        url = path
+        print(f"[Gateway] {request.method} {SERVICES[service_name]}{url}")
+        
+        if request.method == "OPTIONS":
+            # Preflight CORS request: respond OK and let CORSMiddleware append headers
+            return JSONResponse(content={}, status_code=200)
+        elif request.method not in ("GET", "POST", "PUT", "DELETE"):
+            raise HTTPException(status_code=405, detail="Método no permitido")
+        elif PROXY_MODE == "stream":
+            return await stream_proxy_request(client, url, headers, request)
+        elif request.method == "GET":
+            response = await client.get(url, headers=headers, params=request.query_params)
+        elif request.method == "POST":
+            body = await request.body()
+            print(f"[Gateway] Body length: {len(body)}")
+            response = await client.post(url, headers=headers, content=body)
+        elif request.method == "PUT":
+            body = await request.body()
+            response = await client.put(url, headers=headers, content=body)
+        else:
+            response = await client.delete(url, headers=headers)
+        
+        content_type = response.headers.get("content-type", "")
+        
+        # Manejar CSV
+        if content_type.startswith("text/csv"):
+            # httpx ya descomprimió el cuerpo: no reenviar content-encoding ni su content-length
+            csv_headers = {
+                name: value for name, value in response.headers.items()
+                if name.lower() not in HOP_BY_HOP_HEADERS | SERVER_HEADERS | {"content-encoding", "content-length"}
+            }
+            return StreamingResponse(
+                iter([response.content]),
+                media_type="text/csv",
+                headers=csv_headers
             )
         
-        except httpx.RequestError as e:
-            print(f"[Gateway] Error: {str(e)}")
-            raise HTTPException(
-                status_code=503,
-                detail=f"Servicio no disponible: {str(e)}"
+        # Manejar PDF
+        if content_type.startswith("application/pdf"):
+            return Response(
+                content=response.content,
+                media_type="application/pdf",
+                headers={
+                    "Content-Disposition": response.headers.get("content-disposition", "attachment; filename=reporte.pdf")
+                }
+            )
+        
+        # Manejar imágenes
+        if content_type.startswith("image/"):
+            return Response(
+                content=response.content,
+                media_type=content_type,
+                headers={
+                    "Cache-Control": IMAGE_CACHE_CONTROL
+                }
             )
+        
+        # Intentar parsear JSON, si falla devolver contenido raw
+        try:
+            content = response.json() if response.text else {}
+        except Exception:
+            content = {"detail": response.text or "Sin contenido"}
+        
+        # Filtrar headers problemáticos
+        response_headers = dict(response.headers)
+        response_headers.pop("content-length", None)
+        response_headers.pop("content-encoding", None)
+        response_headers.pop("transfer-encoding", None)
+        
+        return JSONResponse(
+            content=content,
+            status_code=response.status_code
+        )
+    
+    except httpx.RequestError as e:
+        print(f"[Gateway] Error: {str(e)}")
+        raise HTTPException(
+            status_code=503,
+            detail=f"Servicio no disponible: {str(e)}"
+        )
 
 @app.api_route("/api/users/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def users_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["users"], f"/api/users/{path}", request)
+    return await proxy_request("users", f"/api/users/{path}", request)
 
 @app.api_route("/api/events/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def events_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["events"], f"/api/events/{path}", request)
+    return await proxy_request("events", f"/api/events/{path}", request)
 
 @app.api_route("/api/events", methods=["GET", "POST", "OPTIONS"])
 async def events_root_proxy(request: Request):
-    return await proxy_request(SERVICES["events"], "/api/events", request)
+    return await proxy_request("events", "/api/events", request)
 
 @app.api_route("/api/attendances/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def attendances_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["events"], f"/api/attendances/{path}", request)
+    return await proxy_request("events", f"/api/attendances/{path}", request)
 
 @app.api_route("/api/attendances", methods=["GET", "POST", "OPTIONS"])
 async def attendances_root_proxy(request: Request):
-    return await proxy_request(SERVICES["events"], "/api/attendances", request)
+    return await proxy_request("events", "/api/attendances", request)
 
 @app.api_route("/api/reports/export/event/{event_id}/pdf", methods=["GET", "OPTIONS"])
 async def reports_pdf_proxy(event_id: str, request: Request):
-    return await proxy_request(SERVICES["reports"], f"/api/reports/export/event/{event_id}/pdf", request)
+    return await proxy_request("reports", f"/api/reports/export/event/{event_id}/pdf", request)
 
 @app.api_route("/api/reports/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def reports_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["reports"], f"/api/reports/{path}", request)
+    return await proxy_request("reports", f"/api/reports/{path}", request)
 
 @app.api_route("/api/pre-registros/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def pre_registros_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["events"], f"/api/pre-registros/{path}", request)
+    return await proxy_request("events", f"/api/pre-registros/{path}", request)
 
 @app.api_route("/api/pre-registros", methods=["GET", "POST", "OPTIONS"])
 async def pre_registros_root_proxy(request: Request):
-    return await proxy_request(SERVICES["events"], "/api/pre-registros", request)
+    return await proxy_request("events", "/api/pre-registros", request)
 
 @app.api_route("/api/students/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"])
 async def students_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["events"], f"/api/students/{path}", request)
+    return await proxy_request("events", f"/api/students/{path}", request)
 
 @app.api_route("/api/students", methods=["GET", "POST", "OPTIONS"])
 async def students_root_proxy(request: Request):
-    return await proxy_request(SERVICES["events"], "/api/students", request)
+    return await proxy_request("events", "/api/students", request)
 
 @app.api_route("/api/uploads/{path:path}", methods=["GET"])
 async def api_uploads_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["events"], f"/uploads/{path}", request)
+    return await proxy_request("events", f"/uploads/{path}", request)
 
 @app.api_route("/uploads/{path:path}", methods=["GET"])
 async def uploads_proxy(path: str, request: Request):
-    return await proxy_request(SERVICES["events"], f"/uploads/{path}", request)
+    return await proxy_request("events", f"/uploads/{path}", request)
 
 @app.get("/health")
 async def health_check():
     health_status = {}
     
-    async with httpx.AsyncClient(timeout=5.0) as client:
-        for service_name, service_url in SERVICES.items():
-            try:
-                response = await client.get(f"{service_url}/")
-                health_status[service_name] = {
-                    "status": "healthy" if response.status_code == 200 else "unhealthy",
-                    "response_time": response.elapsed.total_seconds()
-                }
-            except Exception as e:
-                health_status[service_name] = {
-                    "status": "unhealthy",
-                    "error": str(e)
-                }
+    for service_name in SERVICES:
+        try:
+            response = await get_client(service_name).get("/", timeout=5.0)
+            health_status[service_name] = {
+                "status": "healthy" if response.status_code == 200 else "unhealthy",
+                "response_time": response.elapsed.total_seconds()
+            }
+        except Exception as e:
+            health_status[service_name] = {
+                "status": "unhealthy",
+                "error": str(e)
+            }
     
     all_healthy = all(s["status"] == "healthy" for s in health_status.values())
     
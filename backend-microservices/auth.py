@@ -0,0 +1,320 @@
+"""
+Verificación de tokens JWT compartida por los microservicios
+Valida localmente los tokens HS256 emitidos por users-service usando SECRET_KEY;
+la verificación remota contra users-service queda como respaldo opcional,
+con cache TTL/LRU de resultados y un endpoint interno de revocación.
+Cada token lleva la versión del usuario (claim tv, users.token_version); al
+cambiar la contraseña la versión sube y los tokens anteriores se rechazan.
+"""
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import httpx
+from fastapi import APIRouter, Depends, Header, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from pydantic import BaseModel
+
+try:
+    import jwt
+except ImportError:  # PyJWT no instalado: solo verificación remota
+    jwt = None
+
+logger = logging.getLogger(__name__)
+
+security = HTTPBearer()
+
+ALGORITHM = "HS256"
+
+def _get_settings():
+    """Lee la configuración en cada llamada (las apps cargan .env después de importar)."""
+    return {
+        "secret_key": os.getenv("SECRET_KEY", "your-secret-key-change-in-production"),
+        "users_service_url": os.getenv("USERS_SERVICE_URL", "http://localhost:8101"),
+        # local: valida la firma en el servicio; remote: siempre pregunta a users-service
+        "mode": os.getenv("AUTH_VERIFY_MODE", "local").lower(),
+        # Si la firma local no coincide (p.ej. rotación de SECRET_KEY), consultar a users-service
+        "remote_fallback": os.getenv("AUTH_REMOTE_FALLBACK", "false").lower() == "true",
+        "remote_timeout": float(os.getenv("AUTH_REMOTE_TIMEOUT", "10")),
+        # Cache de verificaciones remotas positivas (0 desactiva)
+        "cache_ttl": float(os.getenv("AUTH_CACHE_TTL", "60")),
+        "cache_max_size": int(os.getenv("AUTH_CACHE_MAX_SIZE", "1024")),
+        # Recarga de users.token_version desde la base (segundos, 0 = solo avisos de users-service)
+        "token_version_refresh": float(os.getenv("AUTH_TOKEN_VERSION_REFRESH", "60")),
+        # Clave compartida para los endpoints internos de revocación; nunca SECRET_KEY,
+        # que viajaría en texto plano entre servicios. Sin ella no hay revocación por aviso.
+        "internal_api_key": os.getenv("INTERNAL_API_KEY") or None,
+    }
+
+def _unverified_claims(token: str) -> dict:
+    """Claims del token sin verificar la firma (ya verificada por users-service o en cache)."""
+    try:
+        payload_b64 = token.split(".")[1]
+        payload_b64 += "=" * (-len(payload_b64) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload_b64))
+        return claims if isinstance(claims, dict) else {}
+    except (IndexError, ValueError, TypeError):
+        return {}
+
+def _token_expiry(token: str) -> Optional[float]:
+    """Lee el claim exp sin verificar la firma (solo para acotar el TTL del cache)."""
+    try:
+        exp = _unverified_claims(token).get("exp")
+        return float(exp) if exp is not None else None
+    except (ValueError, TypeError):
+        return None
+
+class TokenCache:
+    """Cache LRU con TTL de tokens verificados por users-service, indexado por hash del token."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries = OrderedDict()  # hash -> (expira_en, token_data)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self._key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, token_data = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return token_data
+
+    def set(self, token: str, token_data: dict, ttl: float):
+        """Guarda el resultado; nunca más allá del exp del propio token."""
+        expires_at = time.time() + ttl
+        token_exp = _token_expiry(token)
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        if expires_at <= time.time():
+            return
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (expires_at, token_data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def revoke_user(self, user_id: str) -> int:
+        """Elimina todos los tokens cacheados de un usuario. Devuelve cuántos se borraron."""
+        with self._lock:
+            keys = [k for k, (_, data) in self._entries.items() if data.get("user_id") == user_id]
+            for key in keys:
+                del self._entries[key]
+        return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+def _unauthorized(detail: str = "Token inválido"):
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+token_cache = TokenCache(max_size=_get_settings()["cache_max_size"])
+
+class TokenVersions:
+    """Versión vigente de tokens por usuario (users.token_version).
+
+    Se actualiza con los avisos de users-service y con la recarga periódica desde
+    la base, que cubre otros workers y reinicios. Las versiones solo suben.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def update(self, user_id: str, version: int):
+        with self._lock:
+            if version > self._versions.get(user_id, 0):
+                self._versions[user_id] = version
+
+    def merge(self, versions: dict):
+        with self._lock:
+            for user_id, version in versions.items():
+                if version > self._versions.get(user_id, 0):
+                    self._versions[user_id] = version
+
+token_versions = TokenVersions()
+
+def check_token_version(user_id: str, claims: dict):
+    """Rechaza tokens emitidos antes del último cambio de contraseña (sin claim tv = versión 0)."""
+    try:
+        version = int(claims.get("tv") or 0)
+    except (TypeError, ValueError):
+        raise _unauthorized()
+    if version < token_versions.get(user_id):
+        raise _unauthorized("Token revocado")
+
+
+def token_data_from_payload(payload: dict) -> dict:
+    """Construye la misma respuesta que /api/users/verify-token."""
+    if payload.get("sub") is None:
+        raise _unauthorized()
+    return {
+        "valid": True,
+        "user_id": payload.get("sub"),
+        "username": payload.get("username"),
+        "role": payload.get("role")
+    }
+
+def verify_token_local(token: str, secret_key: str) -> dict:
+    """Valida firma y expiración del token (mismos claims que decode_token en users-service)."""
+    try:
+        payload = jwt.decode(token, secret_key, algorithms=[ALGORITHM])
+    except jwt.ExpiredSignatureError:
+        raise _unauthorized("Token expirado")
+    except jwt.InvalidTokenError:
+        raise _unauthorized()
+    token_data = token_data_from_payload(payload)
+    check_token_version(token_data["user_id"], payload)
+    return token_data
+
+async def verify_token_remote(token: str, users_service_url: str, timeout: float, cache_ttl: float = 0) -> dict:
+    """Verifica el token con users-service (POST /api/users/verify-token).
+
+    Con cache_ttl > 0 los resultados positivos se reutilizan desde token_cache.
+    """
+    if cache_ttl > 0:
+        cached = token_cache.get(token)
+        if cached is not None:
+            check_token_version(cached["user_id"], _unverified_claims(token))
+            return cached
+
+    try:
+        async with httpx.AsyncClient(timeout=timeout) as client:
+            response = await client.post(
+                f"{users_service_url}/api/users/verify-token",
+                headers={"Authorization": f"Bearer {token}"}
+            )
+    except httpx.TimeoutException:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Timeout al verificar token"
+        )
+    except httpx.RequestError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Servicio de usuarios no disponible"
+        )
+
+    if response.status_code != 200:
+        raise _unauthorized()
+    token_data = response.json()
+    if cache_ttl > 0:
+        token_cache.set(token, token_data, cache_ttl)
+    return token_data
+
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Dependencia FastAPI: devuelve {valid, user_id, username, role} o lanza 401."""
+    token = credentials.credentials
+    settings = _get_settings()
+
+    if settings["mode"] == "remote" or jwt is None:
+        return await verify_token_remote(token, settings["users_service_url"], settings["remote_timeout"], settings["cache_ttl"])
+
+    try:
+        return verify_token_local(token, settings["secret_key"])
+    except HTTPException as e:
+        # Un token expirado nunca se reintenta; una firma desconocida sí, si hay respaldo
+        if settings["remote_fallback"] and e.detail not in ("Token expirado", "Token revocado"):
+            logger.warning("Token rechazado localmente, verificando con users-service")
+            return await verify_token_remote(token, settings["users_service_url"], settings["remote_timeout"], settings["cache_ttl"])
+        raise
+
+# ==================== REVOCACIÓN ====================
+
+class TokenRevocation(BaseModel):
+    user_id: str
+    token_version: int
+
+router = APIRouter()
+
+@router.post("/internal/auth/revoke")
+def revoke_user_tokens(revocation: TokenRevocation, x_internal_key: Optional[str] = Header(None)):
+    """Invalida los tokens de un usuario anteriores a token_version (lo llama users-service al cambiar la contraseña)."""
+    expected = _get_settings()["internal_api_key"]
+    if not expected:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="INTERNAL_API_KEY no configurada")
+    if not x_internal_key or not hmac.compare_digest(x_internal_key, expected):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Clave interna inválida")
+    token_versions.update(revocation.user_id, revocation.token_version)
+    removed = token_cache.revoke_user(revocation.user_id)
+    return {"user_id": revocation.user_id, "revoked": removed}
+
+def push_token_revocation(user_id: str, token_version: int, service_urls: list):
+    """Notifica a cada servicio la nueva versión de tokens del usuario (mejor esfuerzo).
+
+    Si un aviso se pierde, la recarga periódica de token_version lo cubre.
+    """
+    internal_api_key = _get_settings()["internal_api_key"]
+    if not internal_api_key:
+        logger.warning("INTERNAL_API_KEY no configurada: los servicios se enteran por la recarga de token_version")
+        return
+    headers = {"X-Internal-Key": internal_api_key}
+    with httpx.Client(timeout=5.0) as client:
+        for service_url in service_urls:
+            try:
+                response = client.post(
+                    f"{service_url}/internal/auth/revoke",
+                    json={"user_id": user_id, "token_version": token_version},
+                    headers=headers
+                )
+                if response.status_code != 200:
+                    logger.warning(f"Revocación rechazada por {service_url}: {response.status_code}")
+            except httpx.RequestError as e:
+                logger.warning(f"No se pudo notificar revocación a {service_url}: {e}")
+
+def load_token_versions() -> int:
+    """Carga users.token_version desde la base compartida. Devuelve cuántos usuarios tienen versión > 0."""
+    from database import get_db_connection, rows_to_list
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, token_version FROM users WHERE token_version > 0")
+        rows = rows_to_list(cursor.fetchall())
+    token_versions.merge({row["id"]: int(row["token_version"]) for row in rows})
+    return len(rows)
+
+_token_version_task: Optional[asyncio.Task] = None
+
+async def _sync_token_versions():
+    interval = _get_settings()["token_version_refresh"]
+    while True:
+        try:
+            await run_in_threadpool(load_token_versions)
+        except Exception as e:
+            logger.warning(f"No se pudo recargar token_version: {e}")
+        if interval <= 0:
+            return
+        await asyncio.sleep(interval)
+
+def start_token_version_sync():
+    """Carga inicial y recarga periódica de token_version (startup de events/reports-service)."""
+    global _token_version_task
+    _token_version_task = asyncio.get_running_loop().create_task(_sync_token_versions())
+
+def stop_token_version_sync():
+    global _token_version_task
+    if _token_version_task is not None:
+        _token_version_task.cancel()
+        _token_version_task = None
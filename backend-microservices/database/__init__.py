@@ -0,0 +1,39 @@
+"""
+Base de datos compartida para todos los microservicios
+Usa SQLite con estructura SQL estándar o PostgreSQL según DATABASE_URL.
+
+Uso desde un servicio:
+    from database import configure, get_db_connection
+    configure(service="events")
+"""
+import os
+
+from .config import BASE_DIR, configure, get_settings
+from .connection import get_connection, get_db_connection, is_sqlite, release_connection
+from .counters import EVENT_COUNTER_COLUMNS, reconcile_event_counters
+from .postgres import DatabaseBusyError, get_pool_stats
+from .rows import row_to_dict, rows_to_list
+from .schema import init_database, migrate_from_json
+from .streaming import stream_rows
+
+# Ruta por defecto de la base SQLite (configurable con SQLITE_DB_PATH)
+DB_PATH = os.path.join(BASE_DIR, "asistencias.db")
+
+__all__ = [
+    "DB_PATH",
+    "configure",
+    "get_settings",
+    "get_connection",
+    "get_db_connection",
+    "release_connection",
+    "is_sqlite",
+    "get_pool_stats",
+    "DatabaseBusyError",
+    "row_to_dict",
+    "rows_to_list",
+    "stream_rows",
+    "init_database",
+    "migrate_from_json",
+    "EVENT_COUNTER_COLUMNS",
+    "reconcile_event_counters",
+]
@@ -0,0 +1,8 @@
+from . import init_database, migrate_from_json
+
+if __name__ == "__main__":
+    print("Inicializando base de datos...")
+    init_database()
+    print("\nMigrando datos de JSON...")
+    migrate_from_json()
+    print("\n✓ Proceso completado")
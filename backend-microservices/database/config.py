@@ -0,0 +1,102 @@
+"""
+Configuración de la capa de datos
+Cada servicio llama configure(service=...) al arrancar; los parámetros se leen
+de variables de entorno con prefijo del servicio (EVENTS_DB_POOL_MAX_SIZE) y,
+si no existen, de la variable general (DB_POOL_MAX_SIZE).
+"""
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cargar variables de entorno desde el archivo .env en la raíz del proyecto
+load_dotenv(dotenv_path=os.path.join(os.path.dirname(BASE_DIR), ".env"))
+
+# Configurar logging
+logging.basicConfig(
+    level=os.getenv("LOG_LEVEL", "INFO"),
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger("database")
+
+# nombre -> (variable de entorno sin prefijo, valor por defecto, tipo)
+_SETTINGS_SPEC = {
+    "pool_enabled": ("DB_POOL_ENABLED", True, bool),
+    "pool_min_size": ("DB_POOL_MIN_SIZE", 1, int),
+    "pool_max_size": ("DB_POOL_MAX_SIZE", 5, int),
+    # Segundos máximos esperando una conexión libre (después: overflow o 503)
+    "pool_timeout": ("DB_POOL_TIMEOUT", 10.0, float),
+    # Conexiones directas extra permitidas con el pool agotado (0 = responder 503)
+    "pool_overflow": ("DB_POOL_OVERFLOW", 0, int),
+    # Reciclar conexiones antes de que Supabase/pgbouncer las corte
+    "pool_max_lifetime": ("DB_POOL_MAX_LIFETIME", 1800.0, float),
+    # Cerrar conexiones ociosas por encima de min_size
+    "pool_max_idle": ("DB_POOL_MAX_IDLE", 300.0, float),
+    # Re-resolución periódica del hostaddr IPv4 (0 desactiva)
+    "dns_refresh_seconds": ("DB_DNS_REFRESH_SECONDS", 300.0, float),
+    # Filas por lote al recorrer resultados grandes con stream_rows()
+    "stream_batch_size": ("DB_STREAM_BATCH_SIZE", 1000, int),
+    "sqlite_path": ("SQLITE_DB_PATH", os.path.join(BASE_DIR, "asistencias.db"), str),
+    # Modo rendimiento SQLite: WAL, PRAGMAs y una conexión reutilizada por hilo
+    "sqlite_performance_mode": ("SQLITE_PERFORMANCE_MODE", True, bool),
+    "sqlite_reuse_connections": ("SQLITE_REUSE_CONNECTIONS", True, bool),
+    "sqlite_journal_mode": ("SQLITE_JOURNAL_MODE", "WAL", str),
+    "sqlite_synchronous": ("SQLITE_SYNCHRONOUS", "NORMAL", str),
+    # Milisegundos esperando un bloqueo de escritura antes de "database is locked"
+    "sqlite_busy_timeout": ("SQLITE_BUSY_TIMEOUT", 5000, int),
+    # Negativo = KiB (-20000 ≈ 20 MB por conexión)
+    "sqlite_cache_size": ("SQLITE_CACHE_SIZE", -20000, int),
+    "sqlite_mmap_size": ("SQLITE_MMAP_SIZE", 268435456, int),
+    "sqlite_foreign_keys": ("SQLITE_FOREIGN_KEYS", True, bool),
+    # Sentencias preparadas que sqlite3 conserva por conexión
+    "sqlite_statement_cache": ("SQLITE_STATEMENT_CACHE", 256, int),
+}
+
+_service: Optional[str] = None
+_defaults: Dict[str, Any] = {}
+_settings: Optional[Dict[str, Any]] = None
+_settings_lock = threading.Lock()
+
+def _cast(value: str, kind):
+    if kind is bool:
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return kind(value)
+
+def _load_settings() -> Dict[str, Any]:
+    prefix = f"{_service.upper()}_" if _service else None
+    settings = {"service": _service}
+    for name, (env_name, default, kind) in _SETTINGS_SPEC.items():
+        value = os.getenv(f"{prefix}{env_name}") if prefix else None
+        if value is None:
+            value = os.getenv(env_name)
+        settings[name] = _cast(value, kind) if value is not None else _defaults.get(name, default)
+    return settings
+
+def configure(service: Optional[str] = None, **defaults):
+    """Define el servicio que usa la capa de datos y sus valores por defecto.
+
+    Las variables de entorno siempre tienen prioridad sobre los valores pasados aquí.
+    Debe llamarse antes de la primera conexión.
+    """
+    global _service, _defaults, _settings
+    unknown = set(defaults) - set(_SETTINGS_SPEC)
+    if unknown:
+        raise ValueError(f"Parámetros de base de datos desconocidos: {', '.join(sorted(unknown))}")
+    with _settings_lock:
+        if _settings is not None:
+            logger.warning("configure() llamado después de usar la base de datos; se recargan los parámetros")
+        _service = service
+        _defaults = dict(defaults)
+        _settings = None
+
+def get_settings() -> Dict[str, Any]:
+    """Parámetros efectivos (se leen del entorno la primera vez que se piden)."""
+    global _settings
+    if _settings is None:
+        with _settings_lock:
+            if _settings is None:
+                _settings = _load_settings()
+    return _settings
@@ -0,0 +1,62 @@
+"""
+Punto de entrada para obtener y liberar conexiones
+PostgreSQL (con pool) si DATABASE_URL lo indica; SQLite local en otro caso.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+from .config import logger
+from . import postgres
+from .sqlite import connect_sqlite, release_sqlite_connection
+
+def get_connection(dedicated=False):
+    """Obtiene una conexión a la base de datos.
+    Si DATABASE_URL apunta a PostgreSQL, usa psycopg3 con dict_row y pool.
+    En caso contrario, usa SQLite local.
+    Liberar siempre con release_connection() (o usar get_db_connection()).
+    dedicated=True evita la conexión SQLite compartida del hilo (ver connect_sqlite).
+    """
+    db_url = os.getenv("DATABASE_URL")
+    if db_url and db_url.startswith("postgres"):
+        # Inicializar pool si es la primera vez
+        if postgres._pg_pool is None:
+            postgres.init_pg_pool()
+        
+        # Obtener conexión PostgreSQL
+        conn = postgres.get_pg_connection()
+        if conn:
+            return conn
+        
+        logger.warning("No se pudo obtener conexión PostgreSQL, usando SQLite como fallback")
+    
+    # Fallback a SQLite
+    return connect_sqlite(dedicated=dedicated)
+
+def release_connection(conn):
+    """Devuelve la conexión al pool (PostgreSQL) o al hilo (SQLite); en otro caso la cierra."""
+    if conn is None:
+        return
+    if postgres.release_pg_connection(conn):
+        return
+    if release_sqlite_connection(conn):
+        return
+    conn.close()
+
+def is_sqlite(conn) -> bool:
+    """Indica si la conexión es SQLite (para las pocas sentencias que dependen del motor)."""
+    return isinstance(conn, sqlite3.Connection)
+
+@contextmanager
+def get_db_connection():
+    """Context manager para manejar conexiones de forma segura."""
+    conn = get_connection()
+    try:
+        yield conn
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        logger.error(f"Error en transacción de BD: {e}")
+        raise
+    finally:
+        release_connection(conn)
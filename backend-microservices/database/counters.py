@@ -0,0 +1,56 @@
+"""
+Contadores desnormalizados por evento
+events.total_asistencias, events.asistencias_validadas y events.total_preregistros
+se mantienen en cada escritura; reconcile_event_counters() los reconstruye.
+"""
+from .config import logger
+from .connection import get_db_connection, is_sqlite
+
+EVENT_COUNTER_COLUMNS = ("total_asistencias", "asistencias_validadas", "total_preregistros")
+
+def add_counter_columns(cursor, conn):
+    """Agrega las columnas de contadores a una tabla events existente."""
+    if is_sqlite(conn):
+        cursor.execute("PRAGMA table_info(events)")
+        existing = {row[1] for row in cursor.fetchall()}
+        for column in EVENT_COUNTER_COLUMNS:
+            if column not in existing:
+                cursor.execute(f"ALTER TABLE events ADD COLUMN {column} INTEGER NOT NULL DEFAULT 0")
+                logger.info(f"Columna events.{column} agregada")
+    else:
+        for column in EVENT_COUNTER_COLUMNS:
+            cursor.execute(f"ALTER TABLE events ADD COLUMN IF NOT EXISTS {column} INTEGER NOT NULL DEFAULT 0")
+
+def reconcile_event_counters(event_id=None):
+    """Recalcula los contadores a partir de attendances y pre_registros.
+
+    Sin event_id recorre todos los eventos. Devuelve cuántos eventos tenían
+    contadores desactualizados.
+    """
+    # validado es BOOLEAN en Supabase e INTEGER en SQLite: CAST funciona en ambos
+    query = f'''
+        UPDATE events SET
+            total_asistencias = (
+                SELECT COUNT(*) FROM attendances a WHERE a.id_evento = events.id),
+            asistencias_validadas = (
+                SELECT COUNT(*) FROM attendances a
+                WHERE a.id_evento = events.id AND CAST(a.validado AS INTEGER) = 1),
+            total_preregistros = (
+                SELECT COUNT(*) FROM pre_registros p WHERE p.id_evento = events.id)
+        WHERE {'id = %s AND ' if event_id else ''}(
+            total_asistencias <> (
+                SELECT COUNT(*) FROM attendances a WHERE a.id_evento = events.id)
+            OR asistencias_validadas <> (
+                SELECT COUNT(*) FROM attendances a
+                WHERE a.id_evento = events.id AND CAST(a.validado AS INTEGER) = 1)
+            OR total_preregistros <> (
+                SELECT COUNT(*) FROM pre_registros p WHERE p.id_evento = events.id)
+        )
+    '''
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, (event_id,) if event_id else ())
+        updated = cursor.rowcount
+    if updated:
+        logger.info(f"Contadores reconciliados en {updated} evento(s)")
+    return updated
@@ -0,0 +1,322 @@
+"""
+Conexiones PostgreSQL: conninfo resuelto una vez por proceso, pool psycopg_pool
+y métricas de espera
+"""
+import os
+import socket
+import threading
+import time
+from typing import Any, Dict
+
+from .config import get_settings, logger
+
+# Pool de conexiones PostgreSQL (se inicializa bajo demanda)
+_pg_pool = None
+_pool_lock = threading.Lock()
+# Cupos de conexión directa cuando el pool se agota (DB_POOL_OVERFLOW)
+_overflow_slots = None
+
+class DatabaseBusyError(Exception):
+    """Pool agotado y sin cupo de overflow: los servicios responden 503."""
+
+# Métricas de espera al pedir conexiones al pool
+_pool_metrics = {
+    "requests": 0,
+    "wait_ms_total": 0.0,
+    "wait_ms_max": 0.0,
+    "timeouts": 0,
+    "fallback_connections": 0,
+    "rejected": 0
+}
+_metrics_lock = threading.Lock()
+
+# Parámetros de conexión PostgreSQL resueltos una sola vez por proceso.
+# _pg_conninfo es la URL con sslmode/connect_timeout aplicados. _pg_connect_kwargs
+# nunca se modifica en sitio: el hostaddr re-resuelto en segundo plano y el failover
+# al puerto 6543 construyen un dict nuevo y lo reemplazan (también en el pool), así
+# una conexión en curso nunca ve un dict a medio actualizar.
+_pg_conninfo = None
+_pg_connect_kwargs = {}
+# Puerto explícito de DATABASE_URL (cadena vacía si no trae puerto)
+_pg_url_port = ""
+_conninfo_lock = threading.Lock()
+_dns_refresher = None
+
+def _resolve_ipv4(hostname):
+    """Resuelve el hostname solo a IPv4 (Render no tiene salida IPv6)."""
+    try:
+        ipv4_results = socket.getaddrinfo(hostname, None, socket.AF_INET, socket.SOCK_STREAM)
+        if ipv4_results:
+            return ipv4_results[0][4][0]
+    except Exception as e:
+        logger.warning(f"No se pudo resolver IPv4 para {hostname}: {e}")
+    return None
+
+def _swap_connect_kwargs(**changes):
+    """Reemplaza _pg_connect_kwargs (y los kwargs del pool) por una copia con los cambios."""
+    global _pg_connect_kwargs
+    with _conninfo_lock:
+        kwargs = {**_pg_connect_kwargs, **changes}
+        _pg_connect_kwargs = kwargs
+        if _pg_pool is not None:
+            _pg_pool.kwargs = kwargs
+
+def _refresh_hostaddr(hostname, interval):
+    """Hilo de fondo: re-resuelve el host periódicamente y actualiza hostaddr."""
+    while True:
+        time.sleep(interval)
+        ipv4_addr = _resolve_ipv4(hostname)
+        current = _pg_connect_kwargs.get("hostaddr")
+        if ipv4_addr and ipv4_addr != current:
+            logger.info(f"IPv4 de {hostname} cambió: {current} -> {ipv4_addr}")
+            _swap_connect_kwargs(hostaddr=ipv4_addr)
+
+def _use_pooler_port():
+    """Recuerda el failover al pooler de Supabase (6543) para el resto del proceso."""
+    if _pg_connect_kwargs.get("port") != "6543":
+        logger.warning("Usando puerto 6543 (connection pooler) para las siguientes conexiones")
+        # El pooler en modo transacción no soporta prepared statements
+        _swap_connect_kwargs(port="6543", prepare_threshold=None)
+
+def _can_failover_to_pooler(connect_kwargs):
+    """Solo si DATABASE_URL apunta explícitamente al 5432 y aún no se cambió al 6543."""
+    return _pg_url_port == "5432" and connect_kwargs.get("port") != "6543"
+
+def _get_pg_conninfo():
+    """Devuelve (conninfo, kwargs) calculados la primera vez que se necesitan."""
+    global _pg_conninfo, _pg_connect_kwargs, _pg_url_port, _dns_refresher
+    if _pg_conninfo is not None:
+        return _pg_conninfo, _pg_connect_kwargs
+    
+    from psycopg.rows import dict_row
+    from psycopg.conninfo import conninfo_to_dict
+    
+    with _conninfo_lock:
+        if _pg_conninfo is not None:
+            return _pg_conninfo, _pg_connect_kwargs
+        
+        db_url = os.getenv("DATABASE_URL")
+        # Configurar SSL y timeouts en la URL si no están presentes
+        if "sslmode=" not in db_url:
+            db_url += "&sslmode=require" if "?" in db_url else "?sslmode=require"
+        if "connect_timeout=" not in db_url:
+            db_url += "&connect_timeout=10"
+        
+        kwargs = {"row_factory": dict_row}
+        # Identifica al servicio en pg_stat_activity
+        service = get_settings()["service"]
+        if service and "application_name=" not in db_url:
+            kwargs["application_name"] = f"{service}-service"
+        params = conninfo_to_dict(db_url)
+        if str(params.get("port")) == "6543":
+            kwargs["prepare_threshold"] = None
+        
+        # Forzar IPv4 para evitar problemas con IPv6 en Render
+        hostname = params.get("host")
+        refresh_interval = 0
+        if "hostaddr" not in params and not os.getenv("PGHOSTADDR") and hostname and not hostname.startswith("/"):
+            ipv4_addr = _resolve_ipv4(hostname)
+            if ipv4_addr:
+                kwargs["hostaddr"] = ipv4_addr
+                logger.info(f"Forzando IPv4: {hostname} -> {ipv4_addr}")
+            refresh_interval = get_settings()["dns_refresh_seconds"]
+        
+        _pg_connect_kwargs = kwargs
+        _pg_url_port = str(params.get("port") or "")
+        _pg_conninfo = db_url
+        
+        # Después de publicar los kwargs: el hilo solo los reemplaza, nunca los pisa antes
+        if refresh_interval > 0:
+            _dns_refresher = threading.Thread(
+                target=_refresh_hostaddr,
+                args=(hostname, refresh_interval),
+                name="pg-dns-refresh",
+                daemon=True
+            )
+            _dns_refresher.start()
+        return _pg_conninfo, _pg_connect_kwargs
+
+def init_pg_pool():
+    """Inicializa el pool de conexiones PostgreSQL."""
+    global _pg_pool, _overflow_slots
+    if _pg_pool is not None:
+        return
+    
+    settings = get_settings()
+    if not settings["pool_enabled"]:
+        return
+    
+    from psycopg_pool import ConnectionPool
+    
+    with _pool_lock:
+        if _pg_pool is not None:
+            return
+        
+        if not os.getenv("DATABASE_URL"):
+            return
+        
+        try:
+            conninfo, connect_kwargs = _get_pg_conninfo()
+            
+            # Crear pool de conexiones con psycopg3; check valida cada conexión
+            # antes de entregarla y las conexiones viejas u ociosas se reciclan.
+            # _swap_connect_kwargs le reasigna kwargs cuando cambia hostaddr o puerto.
+            pool = ConnectionPool(
+                conninfo=conninfo,
+                kwargs=connect_kwargs,
+                min_size=settings["pool_min_size"],
+                max_size=settings["pool_max_size"],
+                timeout=settings["pool_timeout"],
+                max_lifetime=settings["pool_max_lifetime"],
+                max_idle=settings["pool_max_idle"],
+                check=ConnectionPool.check_connection,
+                name=settings["service"] or "asistencias",
+                open=False
+            )
+            # No bloquear el arranque: las conexiones se abren en segundo plano
+            pool.open(wait=False)
+            _overflow_slots = threading.BoundedSemaphore(settings["pool_overflow"]) if settings["pool_overflow"] > 0 else None
+            with _conninfo_lock:
+                # Por si el hilo de DNS reemplazó los kwargs mientras se creaba el pool
+                pool.kwargs = _pg_connect_kwargs
+                _pg_pool = pool
+            logger.info(
+                f"Pool de conexiones PostgreSQL inicializado "
+                f"(min={settings['pool_min_size']}, max={settings['pool_max_size']})"
+            )
+        except Exception as e:
+            logger.error(f"Error al inicializar pool PostgreSQL: {e}")
+            _pg_pool = None
+
+def _record_pool_wait(wait_ms, timed_out=False):
+    with _metrics_lock:
+        _pool_metrics["requests"] += 1
+        _pool_metrics["wait_ms_total"] += wait_ms
+        _pool_metrics["wait_ms_max"] = max(_pool_metrics["wait_ms_max"], wait_ms)
+        if timed_out:
+            _pool_metrics["timeouts"] += 1
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Métricas del pool: tiempos de espera propios más las estadísticas de psycopg_pool."""
+    with _metrics_lock:
+        metrics = dict(_pool_metrics)
+    requests = metrics["requests"]
+    metrics["wait_ms_avg"] = round(metrics["wait_ms_total"] / requests, 2) if requests else 0.0
+    metrics["wait_ms_total"] = round(metrics["wait_ms_total"], 2)
+    metrics["wait_ms_max"] = round(metrics["wait_ms_max"], 2)
+    metrics["enabled"] = _pg_pool is not None
+    if _pg_pool is not None:
+        metrics["pool"] = _pg_pool.get_stats()
+    return metrics
+
+def _connect_overflow():
+    """Conexión directa acotada por DB_POOL_OVERFLOW; sin cupo lanza DatabaseBusyError.
+
+    Sin este límite cada petición que agotó la espera abriría su propia conexión
+    y se superaría max_size y el límite del servidor.
+    """
+    if _overflow_slots is None or not _overflow_slots.acquire(blocking=False):
+        with _metrics_lock:
+            _pool_metrics["rejected"] += 1
+        raise DatabaseBusyError("Pool de conexiones PostgreSQL agotado")
+    try:
+        conn = _connect_direct()
+    except Exception:
+        _overflow_slots.release()
+        raise
+    if conn is None:
+        _overflow_slots.release()
+        return None
+    conn._overflow_slot = True
+    with _metrics_lock:
+        _pool_metrics["fallback_connections"] += 1
+    return conn
+
+def get_pg_connection():
+    """Obtiene una conexión del pool PostgreSQL.
+
+    Si el pool se agota usa un cupo de overflow o lanza DatabaseBusyError; sin
+    pool (desactivado o con error) conecta directo.
+    """
+    from psycopg_pool import PoolTimeout
+    
+    if not os.getenv("DATABASE_URL"):
+        return None
+    
+    if _pg_pool is not None:
+        t0 = time.monotonic()
+        try:
+            conn = _pg_pool.getconn()
+            _record_pool_wait((time.monotonic() - t0) * 1000)
+            return conn
+        except PoolTimeout:
+            _record_pool_wait((time.monotonic() - t0) * 1000, timed_out=True)
+            logger.warning("Pool PostgreSQL agotado")
+            return _connect_overflow()
+        except Exception as e:
+            logger.warning(f"Error obteniendo conexión del pool: {e}")
+        with _metrics_lock:
+            _pool_metrics["fallback_connections"] += 1
+    
+    return _connect_direct()
+
+def _connect_direct():
+    """Conexión directa con reintentos (conninfo ya resuelto)."""
+    import psycopg
+    
+    conninfo, connect_kwargs = _get_pg_conninfo()
+    max_retries = 3
+    retry_delay = 1
+    
+    for attempt in range(max_retries):
+        try:
+            conn = psycopg.connect(conninfo, **connect_kwargs)
+            logger.info(f"Conexión PostgreSQL establecida (intento {attempt + 1})")
+            return conn
+            
+        except psycopg.OperationalError as e:
+            error_msg = str(e).lower()
+            
+            # Si es timeout o problema de red, intentar puerto alternativo (una vez por proceso)
+            if "timeout" in error_msg or "could not connect" in error_msg:
+                if _can_failover_to_pooler(connect_kwargs):
+                    logger.warning("Puerto 5432 falló, intentando puerto 6543 (connection pooler)...")
+                    _use_pooler_port()
+                    conninfo, connect_kwargs = _get_pg_conninfo()
+                    continue
+            
+            if attempt < max_retries - 1:
+                logger.warning(f"Intento {attempt + 1} falló: {e}. Reintentando en {retry_delay}s...")
+                time.sleep(retry_delay)
+                retry_delay *= 2
+            else:
+                logger.error(f"No se pudo conectar a PostgreSQL después de {max_retries} intentos: {e}")
+                raise
+        
+        except Exception as e:
+            logger.error(f"Error inesperado conectando a PostgreSQL: {e}")
+            if attempt == max_retries - 1:
+                raise
+            time.sleep(retry_delay)
+    
+    return None
+
+def release_pg_connection(conn) -> bool:
+    """Devuelve la conexión al pool si proviene de él. Devuelve False si no es del pool."""
+    if getattr(conn, "_overflow_slot", False):
+        conn._overflow_slot = False
+        try:
+            conn.close()
+        finally:
+            _overflow_slots.release()
+        return True
+    pool = getattr(conn, "_pool", None)
+    if pool is None or pool is not _pg_pool:
+        return False
+    try:
+        # putconn hace rollback de transacciones abiertas y descarta conexiones rotas
+        _pg_pool.putconn(conn)
+        return True
+    except Exception as e:
+        logger.warning(f"No se pudo devolver la conexión al pool: {e}")
+        return False
@@ -0,0 +1,28 @@
+"""
+Conversión de filas (psycopg dict_row o sqlite3.Row) a diccionarios
+"""
+from typing import Any, Dict, List
+
+def row_to_dict(row) -> Dict[str, Any]:
+    """Convierte una fila de PostgreSQL o SQLite a diccionario"""
+    if row is None:
+        return None
+    # Con row_factory=dict_row, row ya es un dict
+    if isinstance(row, dict):
+        return row
+    # Fallback para otros tipos
+    if hasattr(row, '_asdict'):
+        return row._asdict()
+    elif hasattr(row, 'keys') and hasattr(row, 'values'):
+        return dict(zip(row.keys(), row.values()))
+    else:
+        # Último recurso: intentar convertir directamente
+        try:
+            return dict(row)
+        except (ValueError, TypeError):
+            # Si falla, convertir a dict manualmente
+            return {key: row[key] for key in row.keys()}
+
+def rows_to_list(rows) -> List[Dict[str, Any]]:
+    """Convierte múltiples filas a lista de diccionarios"""
+    return [row_to_dict(row) for row in rows]
@@ -0,0 +1,243 @@
+"""
+Creación del esquema (SQLite) y migración de los datos JSON antiguos
+"""
+import json
+import os
+
+from .config import BASE_DIR, get_settings, logger
+from .connection import get_connection, is_sqlite, release_connection
+from .counters import add_counter_columns, reconcile_event_counters
+
+def add_user_token_version(cursor, conn):
+    """Agrega users.token_version (se incrementa al cambiar la contraseña) a una tabla existente."""
+    if is_sqlite(conn):
+        cursor.execute("PRAGMA table_info(users)")
+        if "token_version" not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE users ADD COLUMN token_version INTEGER NOT NULL DEFAULT 0")
+            logger.info("Columna users.token_version agregada")
+    else:
+        cursor.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0")
+
+def add_student_sync_columns(cursor, conn):
+    """Agrega students.content_hash y students.activo a una tabla existente."""
+    if is_sqlite(conn):
+        cursor.execute("PRAGMA table_info(students)")
+        existing = {row[1] for row in cursor.fetchall()}
+        if "content_hash" not in existing:
+            cursor.execute("ALTER TABLE students ADD COLUMN content_hash TEXT")
+        if "activo" not in existing:
+            cursor.execute("ALTER TABLE students ADD COLUMN activo INTEGER NOT NULL DEFAULT 1")
+            logger.info("Columnas de sincronización agregadas a students")
+    else:
+        cursor.execute("ALTER TABLE students ADD COLUMN IF NOT EXISTS content_hash TEXT")
+        cursor.execute("ALTER TABLE students ADD COLUMN IF NOT EXISTS activo BOOLEAN NOT NULL DEFAULT TRUE")
+
+def init_database():
+    """Inicializa la base de datos con todas las tablas"""
+    logger.info("Inicializando base de datos...")
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # Tabla de usuarios
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id TEXT PRIMARY KEY,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT,
+            password TEXT NOT NULL,
+            full_name TEXT,
+            role TEXT NOT NULL CHECK(role IN ('admin', 'encargado', 'estudiante')),
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            token_version INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    
+    # Bases creadas antes de la revocación de tokens por versión
+    add_user_token_version(cursor, conn)
+    
+    # Tabla de eventos
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS events (
+            id TEXT PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            descripcion TEXT,
+            fecha_hora_inicio TEXT NOT NULL,
+            fecha_hora_fin TEXT,
+            ubicacion TEXT,
+            capacidad_maxima INTEGER,
+            estado TEXT NOT NULL CHECK(estado IN ('activo', 'finalizado', 'cancelado')) DEFAULT 'activo',
+            organizador_id TEXT NOT NULL,
+            imagen_url TEXT,
+            created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            total_asistencias INTEGER NOT NULL DEFAULT 0,
+            asistencias_validadas INTEGER NOT NULL DEFAULT 0,
+            total_preregistros INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (organizador_id) REFERENCES users(id)
+        )
+    ''')
+    
+    # Bases creadas antes de los contadores por evento
+    add_counter_columns(cursor, conn)
+    
+    # Tabla de estudiantes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS students (
+            id TEXT PRIMARY KEY,
+            matricula TEXT UNIQUE NOT NULL,
+            nombre TEXT NOT NULL,
+            carrera TEXT,
+            semestre INTEGER,
+            email TEXT,
+            content_hash TEXT,
+            activo INTEGER NOT NULL DEFAULT 1
+        )
+    ''')
+    
+    # Bases creadas antes de la sincronización incremental del padrón
+    add_student_sync_columns(cursor, conn)
+    
+    # Tabla de pre-registros
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS pre_registros (
+            id TEXT PRIMARY KEY,
+            id_evento TEXT NOT NULL,
+            id_estudiante TEXT NOT NULL,
+            matricula TEXT NOT NULL,
+            fecha_registro TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (id_evento) REFERENCES events(id) ON DELETE CASCADE,
+            UNIQUE(id_evento, matricula)
+        )
+    ''')
+    
+    # Tabla de asistencias
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS attendances (
+            id TEXT PRIMARY KEY,
+            id_credencial TEXT NOT NULL,
+            id_evento TEXT NOT NULL,
+            hora_registro TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            validado INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (id_evento) REFERENCES events(id) ON DELETE CASCADE,
+            UNIQUE(id_credencial, id_evento)
+        )
+    ''')
+    
+    # Índices para mejorar rendimiento
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_estado ON events(estado)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_events_organizador ON events(organizador_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendances_evento ON attendances(id_evento)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendances_validado ON attendances(validado)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendances_credencial ON attendances(id_credencial)')
+    # Reportes: orden por hora_registro (paginación keyset) con y sin filtro de evento
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendances_hora ON attendances(hora_registro, id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendances_evento_hora ON attendances(id_evento, hora_registro)')
+    if not is_sqlite(conn):
+        # Búsqueda por prefijo de matrícula (LIKE '123%'); text_pattern_ops solo existe en PostgreSQL
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_attendances_credencial_prefix ON attendances(id_credencial text_pattern_ops)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_pre_registros_evento ON pre_registros(id_evento)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_students_matricula ON students(matricula)')
+    
+    conn.commit()
+    release_connection(conn)
+    logger.info(f"✓ Base de datos inicializada en: {get_settings()['sqlite_path']}")
+
+def migrate_from_json():
+    """Migra datos existentes de JSON a SQL"""
+    conn = get_connection()
+    cursor = conn.cursor()
+    
+    # Migrar usuarios
+    users_json_path = os.path.join(BASE_DIR, "users-service", "users_db.json")
+    if os.path.exists(users_json_path):
+        with open(users_json_path, 'r', encoding='utf-8') as f:
+            users_data = json.load(f)
+            for user in users_data.get("users", []):
+                try:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO users (id, username, password, role, created_at)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (user['id'], user['username'], user['password'], user['role'], user['created_at']))
+                except Exception as e:
+                    print(f"Error migrando usuario {user.get('username')}: {e}")
+        print(f"✓ Usuarios migrados: {cursor.rowcount}")
+    
+    # Migrar eventos, asistencias, pre-registros y estudiantes
+    events_json_path = os.path.join(BASE_DIR, "events-service", "events_db.json")
+    if os.path.exists(events_json_path):
+        with open(events_json_path, 'r', encoding='utf-8') as f:
+            events_data = json.load(f)
+            
+            # Migrar eventos
+            for event in events_data.get("events", []):
+                try:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO events 
+                        (id, nombre, descripcion, fecha_hora_inicio, fecha_hora_fin, ubicacion, 
+                         capacidad_maxima, estado, organizador_id, imagen_path, created_at, updated_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', (
+                        event['id'], event['nombre'], event.get('descripcion'),
+                        event['fecha_hora_inicio'], event.get('fecha_hora_fin'),
+                        event.get('ubicacion'), event.get('capacidad_maxima'),
+                        event['estado'], event['organizador_id'],
+                        event.get('imagen_url'),  # Renombrar de imagen_url a imagen_path
+                        event['created_at'], event['updated_at']
+                    ))
+                except Exception as e:
+                    print(f"Error migrando evento {event.get('nombre')}: {e}")
+            print(f"✓ Eventos migrados")
+            
+            # Migrar asistencias
+            for att in events_data.get("attendances", []):
+                try:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO attendances 
+                        (id, id_credencial, id_evento, hora_registro, validado)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (
+                        att['id'], att['id_credencial'], att['id_evento'],
+                        att['hora_registro'], 1 if att['validado'] else 0
+                    ))
+                except Exception as e:
+                    print(f"Error migrando asistencia: {e}")
+            print(f"✓ Asistencias migradas")
+            
+            # Migrar pre-registros
+            for pre_reg in events_data.get("pre_registros", []):
+                try:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO pre_registros 
+                        (id, id_evento, id_estudiante, matricula, fecha_registro)
+                        VALUES (?, ?, ?, ?, ?)
+                    ''', (
+                        pre_reg['id'], pre_reg['id_evento'], pre_reg['id_estudiante'],
+                        pre_reg.get('matricula', '00000'),  # Default si no existe
+                        pre_reg['fecha_registro']
+                    ))
+                except Exception as e:
+                    print(f"Error migrando pre-registro: {e}")
+            print(f"✓ Pre-registros migrados")
+            
+            # Migrar estudiantes
+            for student in events_data.get("students", []):
+                try:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO students 
+                        (id, matricula, nombre, carrera, semestre, email)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                    ''', (
+                        student['id'], student['matricula'], student['nombre'],
+                        student.get('carrera'), student.get('semestre'),
+                        student.get('email')
+                    ))
+                except Exception as e:
+                    print(f"Error migrando estudiante {student.get('matricula')}: {e}")
+            print(f"✓ Estudiantes migrados")
+    
+    conn.commit()
+    release_connection(conn)
+    
+    # Los registros migrados no pasaron por los contadores por evento
+    reconcile_event_counters()
+    print("✓ Migración completada")
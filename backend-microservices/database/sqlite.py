@@ -0,0 +1,130 @@
+"""
+Capa de compatibilidad SQLite: acepta el placeholder %s de psycopg
+En modo rendimiento usa WAL, PRAGMAs ajustados y una conexión reutilizada por hilo,
+para que los kioscos puedan leer mientras se registran asistencias.
+"""
+import sqlite3
+import threading
+from functools import lru_cache
+
+from .config import get_settings, logger
+
+_JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+_SYNCHRONOUS_MODES = {"OFF", "NORMAL", "FULL", "EXTRA"}
+
+# Conexiones reutilizables del hilo actual: ruta -> conexión
+_local = threading.local()
+
+@lru_cache(maxsize=512)
+def translate_placeholders(sql: str) -> str:
+    """Convierte el placeholder %s de psycopg al ? de sqlite3 (memoizado por texto SQL)."""
+    return sql.replace('%s', '?')
+
+class SQLiteCompatCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=None):
+        if parameters is None:
+            parameters = ()
+        return super().execute(translate_placeholders(sql), parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return super().executemany(translate_placeholders(sql), seq_of_parameters)
+
+class SQLiteCompatConnection(sqlite3.Connection):
+    def cursor(self, factory=None):
+        return super().cursor(factory or SQLiteCompatCursor)
+
+def _apply_pragmas(conn, settings):
+    """Configura la conexión recién abierta según los parámetros sqlite_*."""
+    journal_mode = settings["sqlite_journal_mode"].upper()
+    if journal_mode in _JOURNAL_MODES:
+        mode = conn.execute(f"PRAGMA journal_mode={journal_mode}").fetchone()[0]
+        if mode.upper() != journal_mode:
+            logger.warning(f"SQLite no aceptó journal_mode={journal_mode}, se usa {mode}")
+    else:
+        logger.warning(f"SQLITE_JOURNAL_MODE inválido: {journal_mode}")
+
+    synchronous = settings["sqlite_synchronous"].upper()
+    if synchronous in _SYNCHRONOUS_MODES:
+        conn.execute(f"PRAGMA synchronous={synchronous}")
+    else:
+        logger.warning(f"SQLITE_SYNCHRONOUS inválido: {synchronous}")
+
+    conn.execute(f"PRAGMA busy_timeout={int(settings['sqlite_busy_timeout'])}")
+    conn.execute(f"PRAGMA cache_size={int(settings['sqlite_cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size={int(settings['sqlite_mmap_size'])}")
+    conn.execute(f"PRAGMA foreign_keys={'ON' if settings['sqlite_foreign_keys'] else 'OFF'}")
+
+def _is_open(conn) -> bool:
+    try:
+        conn.in_transaction
+        return True
+    except sqlite3.ProgrammingError:
+        return False
+
+def _open_sqlite(settings, check_same_thread=True):
+    """Abre una conexión SQLite cuyos cursores traducen %s a ?."""
+    conn = sqlite3.connect(
+        settings["sqlite_path"],
+        check_same_thread=check_same_thread,
+        factory=SQLiteCompatConnection,
+        timeout=settings["sqlite_busy_timeout"] / 1000,
+        # Las sentencias ya traducidas son idénticas entre llamadas: el cache de sqlite3 acierta
+        cached_statements=settings["sqlite_statement_cache"]
+    )
+    conn.row_factory = sqlite3.Row  # Para acceder a columnas por nombre
+    if settings["sqlite_performance_mode"]:
+        _apply_pragmas(conn, settings)
+    return conn
+
+def connect_sqlite(dedicated=False):
+    """Devuelve una conexión SQLite.
+
+    En modo rendimiento cada hilo reutiliza su propia conexión (sqlite3 no permite
+    compartirlas entre hilos); liberarla con release_sqlite_connection().
+    Con dedicated=True abre una conexión propia que puede pasar de un hilo a otro
+    (p.ej. un generador consumido por StreamingResponse) y se cierra al liberarla.
+    """
+    settings = get_settings()
+    if dedicated:
+        return _open_sqlite(settings, check_same_thread=False)
+    if not (settings["sqlite_performance_mode"] and settings["sqlite_reuse_connections"]):
+        logger.debug("Usando SQLite local")
+        return _open_sqlite(settings)
+
+    path = settings["sqlite_path"]
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(path)
+    if conn is None or not _is_open(conn):
+        conn = _open_sqlite(settings)
+        connections[path] = conn
+        logger.debug(f"Nueva conexión SQLite para el hilo {threading.current_thread().name}")
+    return conn
+
+def release_sqlite_connection(conn) -> bool:
+    """Deja la conexión del hilo lista para reutilizarse. Devuelve False si no es reutilizable."""
+    connections = getattr(_local, "connections", None)
+    if not connections or conn not in connections.values():
+        return False
+    if not _is_open(conn):
+        return True
+    try:
+        # No arrastrar transacciones abiertas (y sus bloqueos) a la siguiente petición
+        if conn.in_transaction:
+            conn.rollback()
+    except sqlite3.Error as e:
+        logger.warning(f"Descartando conexión SQLite tras error: {e}")
+        close_sqlite_connection()
+    return True
+
+def close_sqlite_connection():
+    """Cierra las conexiones reutilizables del hilo actual."""
+    connections = getattr(_local, "connections", None) or {}
+    for conn in connections.values():
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+    connections.clear()
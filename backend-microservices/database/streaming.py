@@ -0,0 +1,39 @@
+"""
+Lectura por lotes de resultados grandes (exportaciones)
+PostgreSQL usa un cursor con nombre (server-side); SQLite una conexión dedicada.
+"""
+import uuid
+
+from .config import get_settings, logger
+from .connection import get_connection, is_sqlite, release_connection
+from .rows import row_to_dict
+
+def stream_rows(query, params=(), batch_size=None):
+    """Genera las filas de la consulta como diccionarios, de batch_size en batch_size.
+
+    El resultado completo nunca se carga en memoria. La conexión se libera al
+    agotar el generador o al cerrarlo (p.ej. si el cliente corta la descarga).
+    """
+    batch_size = batch_size or get_settings()["stream_batch_size"]
+    conn = get_connection(dedicated=True)
+    try:
+        if is_sqlite(conn):
+            cursor = conn.cursor()
+        else:
+            # Cursor con nombre: PostgreSQL entrega las filas bajo demanda
+            cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row_to_dict(row)
+        cursor.close()
+    finally:
+        try:
+            # Solo lectura: cerrar la transacción antes de devolver la conexión
+            conn.rollback()
+        except Exception as e:
+            logger.warning(f"No se pudo cerrar la transacción de lectura: {e}")
+        release_connection(conn)
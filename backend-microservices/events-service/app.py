@@ -1,19 +1,20 @@
 from fastapi import FastAPI, HTTPException, Depends, status, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Literal, Optional
 from datetime import datetime
 import os
 import uuid
-import httpx
 import shutil
 from dotenv import load_dotenv
 import cloudinary
 import cloudinary.uploader
 from db_helpers import *
+from database import DatabaseBusyError
+from auth import verify_token, router as auth_router, start_token_version_sync, stop_token_version_sync
+from student_index import find_student, refresh_student_index, start_student_index, stop_student_index, student_index_stats
 
 app = FastAPI(title="Events Service - Sistema de Asistencias")
 
@@ -36,8 +37,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-security = HTTPBearer()
-USERS_SERVICE_URL = os.getenv("USERS_SERVICE_URL", "http://localhost:8101")
+# Pool de base de datos agotado: 503 para que el cliente reintente, en lugar de abrir más conexiones
+@app.exception_handler(DatabaseBusyError)
+async def database_busy_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Base de datos ocupada, intenta de nuevo"},
+        headers={"Retry-After": "1"}
+    )
+
+# Endpoint interno de revocación de tokens cacheados
+app.include_router(auth_router)
+
+@app.on_event("startup")
+async def startup_student_index():
+    start_token_version_sync()
+    await start_student_index()
+
+@app.on_event("shutdown")
+async def shutdown_student_index():
+    stop_student_index()
+    stop_token_version_sync()
 
 # Crear carpeta para imágenes locales (ya no usada en nube) y montar como estática
 UPLOAD_DIR = os.path.join(os.path.dirname(__file__), "uploads", "images")
@@ -93,6 +113,9 @@ class Event(BaseModel):
     created_at: str
     updated_at: str
     imagen_url: Optional[str] = None
+    total_asistencias: int = 0
+    asistencias_validadas: int = 0
+    total_preregistros: int = 0
 
 class AttendanceCreate(BaseModel):
     id_credencial: str
@@ -105,6 +128,7 @@ class Student(BaseModel):
     carrera: Optional[str] = None
     semestre: Optional[int] = None
     email: Optional[str] = None
+    activo: Optional[bool] = None
 
 class Attendance(BaseModel):
     id: str
@@ -114,6 +138,9 @@ class Attendance(BaseModel):
     validado: bool
     estudiante: Optional[Student] = None
 
+class ScanResult(Attendance):
+    pre_registrado: bool = False
+
 class AttendanceValidation(BaseModel):
     validado: bool
 
@@ -138,25 +165,7 @@ class StudentCreate(BaseModel):
 
 # ==================== AUTENTICACIÓN ====================
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        async with httpx.AsyncClient(timeout=10.0) as client:
-            response = await client.post(
-                f"{USERS_SERVICE_URL}/api/users/verify-token",
-                headers={"Authorization": f"Bearer {credentials.credentials}"}
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token inválido"
-                )
-    except httpx.RequestError:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail="Servicio de usuarios no disponible"
-        )
+# verify_token se importa de auth.py (validación local del JWT con SECRET_KEY)
 
 # ==================== EVENTOS ====================
 
@@ -204,8 +213,7 @@ def delete_event_endpoint(event_id: str, token_data: dict = Depends(verify_token
 
 # ==================== ASISTENCIAS ====================
 
-@app.post("/api/attendances", response_model=Attendance, status_code=status.HTTP_201_CREATED)
-def register_attendance(attendance: AttendanceCreate, token_data: dict = Depends(verify_token)):
+def register_attendance_checked(attendance: AttendanceCreate, token_data: dict, check_pre_registro: bool = False) -> dict:
     # Validar formato de matrícula (5 dígitos)
     if not attendance.id_credencial.isdigit() or len(attendance.id_credencial) != 5:
         raise HTTPException(
@@ -213,27 +221,40 @@ def register_attendance(attendance: AttendanceCreate, token_data: dict = Depends
             detail="La matrícula debe tener exactamente 5 dígitos numéricos"
         )
     
-    event = get_event_by_id(attendance.id_evento)
-    if not event:
+    # Estado, capacidad y duplicados se comprueban en la misma transacción que el INSERT
+    result, new_attendance = register_attendance_db(
+        attendance.id_credencial,
+        attendance.id_evento,
+        allow_inactive=token_data.get("role") == "admin",
+        check_pre_registro=check_pre_registro
+    )
+    if result == "not_found":
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Evento no encontrado")
-    
-    # Solo admin puede registrar asistencias en eventos finalizados
-    if event["estado"] != "activo":
-        if token_data.get("role") != "admin":
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo el administrador puede registrar asistencias en eventos finalizados")
-    
-    # Verificar capacidad
-    if event["capacidad_maxima"]:
-        current_attendances = get_event_attendances(attendance.id_evento)
-        if len(current_attendances) >= event["capacidad_maxima"]:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Capacidad máxima del evento alcanzada")
-    
-    new_attendance = create_attendance(attendance.id_credencial, attendance.id_evento)
-    if not new_attendance:
+    if result == "forbidden":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo el administrador puede registrar asistencias en eventos finalizados")
+    if result == "full":
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Capacidad máxima del evento alcanzada")
+    if result == "duplicate":
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Asistencia ya registrada para este estudiante")
     
     return new_attendance
 
+@app.post("/api/attendances", response_model=Attendance, status_code=status.HTTP_201_CREATED)
+def register_attendance(attendance: AttendanceCreate, token_data: dict = Depends(verify_token)):
+    return register_attendance_checked(attendance, token_data)
+
+@app.post("/api/attendances/scan", response_model=ScanResult, status_code=status.HTTP_201_CREATED)
+def scan_attendance(attendance: AttendanceCreate, token_data: dict = Depends(verify_token)):
+    """Registro desde el escáner en una sola petición.
+
+    Valida la matrícula, registra la asistencia y la devuelve con los datos del
+    estudiante (índice en memoria, None si no está en el padrón o fue dado de baja)
+    y si tenía pre-registro.
+    """
+    new_attendance = register_attendance_checked(attendance, token_data, check_pre_registro=True)
+    new_attendance["estudiante"] = find_student(attendance.id_credencial)
+    return new_attendance
+
 @app.get("/api/events/{event_id}/attendances", response_model=List[Attendance])
 def get_attendances_endpoint(event_id: str, token_data: dict = Depends(verify_token)):
     event = get_event_by_id(event_id)
@@ -304,49 +325,81 @@ def get_students_endpoint(token_data: dict = Depends(verify_token)):
 
 @app.get("/api/students/search/{matricula}")
 def search_student_endpoint(matricula: str, token_data: dict = Depends(verify_token)):
-    student = get_student_by_matricula(matricula)
+    # Índice en memoria: la búsqueda del escáner no consulta la base de datos.
+    # Los estudiantes dados de baja en el padrón (activo = false) no se encuentran.
+    student = find_student(matricula)
     if not student:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Estudiante no encontrado en la base de datos")
     return student
 
-@app.post("/api/students/import-excel")
-def import_students_from_excel(token_data: dict = Depends(verify_token)):
+def import_roster_file(file, filename: str, mode: str = "upsert", dry_run: bool = False,
+                       deactivate_missing: bool = False) -> dict:
+    """Importa un padrón XLSX/CSV por bloques; el total de estudiantes sale de un COUNT(*).
+
+    mode="sync" compara contra lo guardado y solo escribe las diferencias (ver roster.sync_roster_chunks).
+    """
     try:
-        import pandas as pd
+        from roster import import_roster_chunks, read_roster_chunks, sync_roster_chunks
     except ImportError:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Pandas no está instalado")
     
+    try:
+        chunks = read_roster_chunks(file, filename)
+        if mode == "sync":
+            result = sync_roster_chunks(chunks, deactivate_missing=deactivate_missing, dry_run=dry_run)
+        else:
+            result = import_roster_chunks(chunks)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except DatabaseBusyError:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al importar: {str(e)}")
+    
+    if not (mode == "sync" and dry_run):
+        refresh_student_index()
+    
+    if mode == "sync":
+        message = (
+            f"{'Cambios detectados' if dry_run else 'Padrón sincronizado'}: {result['inserted']} nuevos, "
+            f"{result['updated']} actualizados, {result['deactivated']} dados de baja"
+        )
+    else:
+        message = f"Se importaron {result['inserted']} estudiantes"
+    return {
+        "message": message,
+        **result,
+        "total_students": count_students()
+    }
+
+@app.post("/api/students/import-excel")
+def import_students_from_excel(token_data: dict = Depends(verify_token)):
+    # Solo el admin puede modificar el padrón de estudiantes
+    if token_data.get("role") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo el administrador puede importar estudiantes")
+    
     excel_path = "../../alumnos.xlsx"
     if not os.path.exists(excel_path):
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Archivo alumnos.xlsx no encontrado")
     
-    try:
-        df = pd.read_excel(excel_path)
-        df.columns = df.columns.str.lower().str.strip()
-        
-        students_list = []
-        for _, row in df.iterrows():
-            matricula = str(row.get('matricula') or row.get('matrícula', ''))
-            nombre = str(row.get('nombre', ''))
-            
-            if not matricula or not nombre:
-                continue
-            
-            students_list.append({
-                'matricula': matricula,
-                'nombre': nombre,
-                'carrera': str(row.get('carrera', '')),
-                'semestre': int(row.get('semestre', 0)) if pd.notna(row.get('semestre')) else None,
-                'email': str(row.get('email', '')) if pd.notna(row.get('email')) else None
-            })
-        
-        imported_count = import_students_bulk(students_list)
-        total_students = len(get_all_students())
-        
-        return {"message": f"Se importaron {imported_count} estudiantes", "total_students": total_students}
+    with open(excel_path, "rb") as f:
+        return import_roster_file(f, excel_path)
+
+@app.post("/api/students/import")
+def import_students_upload(file: UploadFile = File(...), mode: Literal["upsert", "sync"] = "upsert",
+                           dry_run: bool = False, deactivate_missing: bool = False,
+                           token_data: dict = Depends(verify_token)):
+    """Importa el padrón desde un XLSX o CSV subido, leído y guardado por bloques.
+
+    Con mode=sync solo se escriben altas y cambios; con deactivate_missing=true el archivo
+    se toma como el padrón completo y quien no aparece queda inactivo. dry_run solo reporta las diferencias.
+    Devuelve los conteos, errores por fila y el total de estudiantes.
+    """
+    # Solo el admin puede modificar el padrón de estudiantes
+    if token_data.get("role") != "admin":
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Solo el administrador puede importar estudiantes")
     
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=f"Error al importar: {str(e)}")
+    return import_roster_file(file.file, file.filename, mode, dry_run, deactivate_missing)
 
 # ==================== ESTADÍSTICAS ====================
 
@@ -368,21 +421,21 @@ def finalize_event_endpoint(event_id: str, token_data: dict = Depends(verify_tok
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="No tiene permisos para finalizar este evento")
     
     # Usar transacción para garantizar atomicidad
-    from database import get_connection
+    from database import get_connection, release_connection
     conn = get_connection()
     cursor = conn.cursor()
     
     try:
-        # Actualizar estado del evento
+        # Actualizar estado del evento (todas sus asistencias quedan validadas)
         cursor.execute(
-            "UPDATE events SET estado = %s, updated_at = %s WHERE id = %s",
+            "UPDATE events SET estado = %s, updated_at = %s, asistencias_validadas = total_asistencias WHERE id = %s",
             ("finalizado", datetime.now().isoformat(), event_id)
         )
         
-        # Validar todas las asistencias
+        # Validar todas las asistencias ('1' sin tipo sirve para BOOLEAN e INTEGER)
         cursor.execute(
             "UPDATE attendances SET validado = %s WHERE id_evento = %s",
-            (1, event_id)
+            ('1', event_id)
         )
         
         conn.commit()
@@ -392,13 +445,13 @@ def finalize_event_endpoint(event_id: str, token_data: dict = Depends(verify_tok
         from database import row_to_dict
         updated_event = row_to_dict(cursor.fetchone())
         
-        conn.close()
+        release_connection(conn)
         
         return {"message": "Evento finalizado y asistencias validadas", "event": updated_event}
         
     except Exception as e:
         conn.rollback()
-        conn.close()
+        release_connection(conn)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al finalizar evento: {str(e)}"
@@ -457,14 +510,15 @@ def health_check():
     
     # Verificar base de datos
     try:
-        from database import get_connection
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        conn.close()
+        from database import get_db_connection, get_pool_stats
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
         health_status["checks"]["database"] = "connected"
         health_status["database_type"] = "PostgreSQL" if os.getenv("DATABASE_URL", "").startswith("postgres") else "SQLite"
+        health_status["database_pool"] = get_pool_stats()
+        health_status["student_index"] = student_index_stats()
     except Exception as e:
         health_status["status"] = "unhealthy"
         health_status["checks"]["database"] = f"error: {str(e)}"
@@ -4,10 +4,13 @@ Funciones helper para events-service usando SQL
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection, row_to_dict, rows_to_list
+from database import configure, get_db_connection, is_sqlite, row_to_dict, rows_to_list
 from datetime import datetime
 import uuid
 
+# Parámetros de pool y conexión propios de este servicio (EVENTS_DB_*)
+configure(service="events")
+
 # ==================== HELPERS ====================
 
 def convert_datetime_fields(event_dict):
@@ -21,171 +24,204 @@ def convert_datetime_fields(event_dict):
 # ==================== EVENTOS ====================
 
 def get_all_events(estado=None):
-    conn = get_connection()
-    cursor = conn.cursor()
-    if estado:
-        cursor.execute("SELECT * FROM events WHERE estado = %s ORDER BY created_at DESC", (estado,))
-    else:
-        cursor.execute("SELECT * FROM events ORDER BY created_at DESC")
-    events = rows_to_list(cursor.fetchall())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        if estado:
+            cursor.execute("SELECT * FROM events WHERE estado = %s ORDER BY created_at DESC", (estado,))
+        else:
+            cursor.execute("SELECT * FROM events ORDER BY created_at DESC")
+        events = rows_to_list(cursor.fetchall())
     # Convertir datetime a string en todos los eventos
     return [convert_datetime_fields(event) for event in events]
 
 def get_event_by_id(event_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-    event = cursor.fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+        event = cursor.fetchone()
     event_dict = row_to_dict(event) if event else None
     return convert_datetime_fields(event_dict) if event_dict else None
 
 def create_event_db(event_data, organizador_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    event_id = str(uuid.uuid4())
-    now = datetime.now().isoformat()
-    
-    cursor.execute('''
-        INSERT INTO events (id, nombre, descripcion, fecha_hora_inicio, fecha_hora_fin, 
-                           ubicacion, capacidad_maxima, estado, organizador_id, imagen_url, 
-                           created_at, updated_at)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-    ''', (
-        event_id, event_data.nombre, event_data.descripcion,
-        event_data.fecha_hora_inicio, event_data.fecha_hora_fin,
-        event_data.ubicacion, event_data.capacidad_maxima,
-        'activo', organizador_id, event_data.imagen_url,
-        now, now
-    ))
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-    new_event = row_to_dict(cursor.fetchone())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        event_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        
+        cursor.execute('''
+            INSERT INTO events (id, nombre, descripcion, fecha_hora_inicio, fecha_hora_fin, 
+                               ubicacion, capacidad_maxima, estado, organizador_id, imagen_url, 
+                               created_at, updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        ''', (
+            event_id, event_data.nombre, event_data.descripcion,
+            event_data.fecha_hora_inicio, event_data.fecha_hora_fin,
+            event_data.ubicacion, event_data.capacidad_maxima,
+            'activo', organizador_id, event_data.imagen_url,
+            now, now
+        ))
+        conn.commit()
+        
+        cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+        new_event = row_to_dict(cursor.fetchone())
     
     return convert_datetime_fields(new_event)
 
 def update_event(event_id, event_data):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    updates = []
-    params = []
-    
-    if event_data.nombre is not None:
-        updates.append("nombre = %s")
-        params.append(event_data.nombre)
-    if event_data.descripcion is not None:
-        updates.append("descripcion = %s")
-        params.append(event_data.descripcion)
-    if event_data.fecha_hora_inicio is not None:
-        updates.append("fecha_hora_inicio = %s")
-        params.append(event_data.fecha_hora_inicio)
-    if event_data.fecha_hora_fin is not None:
-        updates.append("fecha_hora_fin = %s")
-        params.append(event_data.fecha_hora_fin)
-    if event_data.ubicacion is not None:
-        updates.append("ubicacion = %s")
-        params.append(event_data.ubicacion)
-    if event_data.capacidad_maxima is not None:
-        updates.append("capacidad_maxima = %s")
-        params.append(event_data.capacidad_maxima)
-    if event_data.estado is not None:
-        updates.append("estado = %s")
-        params.append(event_data.estado)
-    if event_data.imagen_url is not None:
-        updates.append("imagen_url = %s")
-        params.append(event_data.imagen_url)
-    
-    updates.append("updated_at = %s")
-    params.append(datetime.now().isoformat())
-    params.append(event_id)
-    
-    query = f"UPDATE events SET {', '.join(updates)} WHERE id = %s"
-    cursor.execute(query, params)
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-    updated_event = row_to_dict(cursor.fetchone())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        updates = []
+        params = []
+        
+        if event_data.nombre is not None:
+            updates.append("nombre = %s")
+            params.append(event_data.nombre)
+        if event_data.descripcion is not None:
+            updates.append("descripcion = %s")
+            params.append(event_data.descripcion)
+        if event_data.fecha_hora_inicio is not None:
+            updates.append("fecha_hora_inicio = %s")
+            params.append(event_data.fecha_hora_inicio)
+        if event_data.fecha_hora_fin is not None:
+            updates.append("fecha_hora_fin = %s")
+            params.append(event_data.fecha_hora_fin)
+        if event_data.ubicacion is not None:
+            updates.append("ubicacion = %s")
+            params.append(event_data.ubicacion)
+        if event_data.capacidad_maxima is not None:
+            updates.append("capacidad_maxima = %s")
+            params.append(event_data.capacidad_maxima)
+        if event_data.estado is not None:
+            updates.append("estado = %s")
+            params.append(event_data.estado)
+        if event_data.imagen_url is not None:
+            updates.append("imagen_url = %s")
+            params.append(event_data.imagen_url)
+        
+        updates.append("updated_at = %s")
+        params.append(datetime.now().isoformat())
+        params.append(event_id)
+        
+        query = f"UPDATE events SET {', '.join(updates)} WHERE id = %s"
+        cursor.execute(query, params)
+        conn.commit()
+        
+        cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+        updated_event = row_to_dict(cursor.fetchone())
     return convert_datetime_fields(updated_event)
 
 def delete_event(event_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
-    conn.commit()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # Borrar dependientes explícitamente: SQLite sin foreign_keys no aplica ON DELETE CASCADE
+        # y dejaría asistencias huérfanas fuera de los contadores
+        cursor.execute("DELETE FROM attendances WHERE id_evento = %s", (event_id,))
+        cursor.execute("DELETE FROM pre_registros WHERE id_evento = %s", (event_id,))
+        cursor.execute("DELETE FROM events WHERE id = %s", (event_id,))
+        conn.commit()
 
 # ==================== ASISTENCIAS ====================
 
 def get_event_attendances(event_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM attendances WHERE id_evento = %s ORDER BY hora_registro DESC", (event_id,))
-    attendances = rows_to_list(cursor.fetchall())
-    
-    if not attendances:
-        conn.close()
-        return []
-    
-    # Optimización: obtener todos los estudiantes en una sola query
-    matriculas = [att['id_credencial'] for att in attendances]
-    placeholders = ','.join(['%s'] * len(matriculas))
-    cursor.execute(f"SELECT * FROM students WHERE matricula IN ({placeholders})", matriculas)
-    students_rows = cursor.fetchall()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM attendances WHERE id_evento = %s ORDER BY hora_registro DESC", (event_id,))
+        attendances = rows_to_list(cursor.fetchall())
+        
+        if not attendances:
+            return []
+        
+        # Optimización: obtener todos los estudiantes en una sola query
+        matriculas = [att['id_credencial'] for att in attendances]
+        placeholders = ','.join(['%s'] * len(matriculas))
+        cursor.execute(f"SELECT * FROM students WHERE matricula IN ({placeholders})", matriculas)
+        students_rows = cursor.fetchall()
+        
+        # Crear diccionario de estudiantes por matrícula para búsqueda rápida
+        students_dict = {row['matricula']: row_to_dict(row) for row in students_rows}
+        
+        # Enriquecer asistencias con información del estudiante
+        for att in attendances:
+            att['validado'] = bool(att['validado'])
+            att['estudiante'] = students_dict.get(att['id_credencial'], None)
+            # Convertir datetime a string
+            convert_datetime_fields(att)
     
-    # Crear diccionario de estudiantes por matrícula para búsqueda rápida
-    students_dict = {row['matricula']: row_to_dict(row) for row in students_rows}
-    
-    # Enriquecer asistencias con información del estudiante
-    for att in attendances:
-        att['validado'] = bool(att['validado'])
-        att['estudiante'] = students_dict.get(att['id_credencial'], None)
-        # Convertir datetime a string
-        convert_datetime_fields(att)
-    
-    conn.close()
     return attendances
 
-def create_attendance(id_credencial, id_evento):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Verificar si ya existe
-    cursor.execute("SELECT id FROM attendances WHERE id_credencial = %s AND id_evento = %s", 
-                  (id_credencial, id_evento))
-    if cursor.fetchone():
-        conn.close()
-        return None
-    
-    attendance_id = str(uuid.uuid4())
-    now = datetime.now().isoformat()
-    
-    cursor.execute('''
-        INSERT INTO attendances (id, id_credencial, id_evento, hora_registro, validado)
-        VALUES (%s, %s, %s, %s, %s)
-    ''', (attendance_id, id_credencial, id_evento, now, 0))
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM attendances WHERE id = %s", (attendance_id,))
-    new_attendance = row_to_dict(cursor.fetchone())
-    conn.close()
-    new_attendance['validado'] = bool(new_attendance['validado'])
-    return convert_datetime_fields(new_attendance)
+def register_attendance_db(id_credencial, id_evento, allow_inactive=False, check_pre_registro=False):
+    """Registra una asistencia en una sola transacción.
+
+    El incremento condicional de events.total_asistencias comprueba estado y
+    capacidad y bloquea la fila del evento, de modo que dos escáneres
+    simultáneos no pueden superar capacidad_maxima.
+    Con check_pre_registro la asistencia incluye pre_registrado (misma conexión).
+    Devuelve (resultado, asistencia) con resultado en
+    "created", "not_found", "forbidden", "full" o "duplicate".
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Solo admin puede registrar asistencias en eventos finalizados
+        state_check = "" if allow_inactive else "AND estado = 'activo'"
+        cursor.execute(f'''
+            UPDATE events SET total_asistencias = total_asistencias + 1
+            WHERE id = %s {state_check}
+            AND (capacidad_maxima IS NULL OR capacidad_maxima = 0 OR total_asistencias < capacidad_maxima)
+            RETURNING id
+        ''', (id_evento,))
+        
+        if cursor.fetchone():
+            attendance_id = str(uuid.uuid4())
+            now = datetime.now().isoformat()
+            cursor.execute('''
+                INSERT INTO attendances (id, id_credencial, id_evento, hora_registro)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (id_credencial, id_evento) DO NOTHING
+                RETURNING *
+            ''', (attendance_id, id_credencial, id_evento, now))
+            new_attendance = cursor.fetchone()
+            if new_attendance:
+                new_attendance = row_to_dict(new_attendance)
+                new_attendance['validado'] = bool(new_attendance['validado'])
+                if check_pre_registro:
+                    cursor.execute("SELECT 1 FROM pre_registros WHERE id_evento = %s AND matricula = %s",
+                                  (id_evento, id_credencial))
+                    new_attendance['pre_registrado'] = cursor.fetchone() is not None
+                return "created", convert_datetime_fields(new_attendance)
+            # Ya registrada: deshacer el incremento del contador
+            conn.rollback()
+            return "duplicate", None
+        
+        # El incremento no aplicó: averiguar por qué
+        cursor.execute("SELECT estado FROM events WHERE id = %s", (id_evento,))
+        event = cursor.fetchone()
+        if not event:
+            return "not_found", None
+        if row_to_dict(event)["estado"] != "activo" and not allow_inactive:
+            return "forbidden", None
+        cursor.execute("SELECT 1 FROM attendances WHERE id_credencial = %s AND id_evento = %s",
+                      (id_credencial, id_evento))
+        return ("duplicate" if cursor.fetchone() else "full"), None
 
 def validate_attendance(attendance_id, validado):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("UPDATE attendances SET validado = %s WHERE id = %s", 
-                  (1 if validado else 0, attendance_id))
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM attendances WHERE id = %s", (attendance_id,))
-    attendance = row_to_dict(cursor.fetchone())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # '1'/'0' sin tipo: PostgreSQL los convierte a BOOLEAN y SQLite a INTEGER
+        value = '1' if validado else '0'
+        cursor.execute("UPDATE attendances SET validado = %s WHERE id = %s AND validado <> %s RETURNING id_evento",
+                      (value, attendance_id, value))
+        changed = cursor.fetchone()
+        if changed:
+            # Solo cuenta los cambios reales de estado
+            cursor.execute(
+                "UPDATE events SET asistencias_validadas = asistencias_validadas + %s WHERE id = %s",
+                (1 if validado else -1, row_to_dict(changed)["id_evento"])
+            )
+        
+        cursor.execute("SELECT * FROM attendances WHERE id = %s", (attendance_id,))
+        attendance = row_to_dict(cursor.fetchone())
     if attendance:
         attendance['validado'] = bool(attendance['validado'])
         convert_datetime_fields(attendance)
@@ -194,11 +230,10 @@ def validate_attendance(attendance_id, validado):
 # ==================== PRE-REGISTROS ====================
 
 def get_event_pre_registros(event_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM pre_registros WHERE id_evento = %s ORDER BY fecha_registro DESC", (event_id,))
-    pre_registros = rows_to_list(cursor.fetchall())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM pre_registros WHERE id_evento = %s ORDER BY fecha_registro DESC", (event_id,))
+        pre_registros = rows_to_list(cursor.fetchall())
     # Convertir datetime a string en todos los pre-registros
     for pr in pre_registros:
         if 'fecha_registro' in pr and isinstance(pr['fecha_registro'], datetime):
@@ -206,28 +241,27 @@ def get_event_pre_registros(event_id):
     return pre_registros
 
 def create_pre_registro(id_evento, id_estudiante, matricula):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Verificar si ya existe
-    cursor.execute("SELECT id FROM pre_registros WHERE id_evento = %s AND matricula = %s", 
-                  (id_evento, matricula))
-    if cursor.fetchone():
-        conn.close()
-        return None
-    
-    pre_registro_id = str(uuid.uuid4())
-    now = datetime.now().isoformat()
-    
-    cursor.execute('''
-        INSERT INTO pre_registros (id, id_evento, id_estudiante, matricula, fecha_registro)
-        VALUES (%s, %s, %s, %s, %s)
-    ''', (pre_registro_id, id_evento, id_estudiante, matricula, now))
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM pre_registros WHERE id = %s", (pre_registro_id,))
-    new_pre_registro = row_to_dict(cursor.fetchone())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Verificar si ya existe
+        cursor.execute("SELECT id FROM pre_registros WHERE id_evento = %s AND matricula = %s", 
+                      (id_evento, matricula))
+        if cursor.fetchone():
+            return None
+        
+        pre_registro_id = str(uuid.uuid4())
+        now = datetime.now().isoformat()
+        
+        cursor.execute('''
+            INSERT INTO pre_registros (id, id_evento, id_estudiante, matricula, fecha_registro)
+            VALUES (%s, %s, %s, %s, %s)
+        ''', (pre_registro_id, id_evento, id_estudiante, matricula, now))
+        cursor.execute("UPDATE events SET total_preregistros = total_preregistros + 1 WHERE id = %s", (id_evento,))
+        conn.commit()
+        
+        cursor.execute("SELECT * FROM pre_registros WHERE id = %s", (pre_registro_id,))
+        new_pre_registro = row_to_dict(cursor.fetchone())
     # Convertir datetime a string para compatibilidad con Pydantic
     if new_pre_registro and 'fecha_registro' in new_pre_registro:
         if isinstance(new_pre_registro['fecha_registro'], datetime):
@@ -235,11 +269,10 @@ def create_pre_registro(id_evento, id_estudiante, matricula):
     return new_pre_registro
 
 def get_student_pre_registros_db(student_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM pre_registros WHERE id_estudiante = %s ORDER BY fecha_registro DESC", (student_id,))
-    pre_registros = rows_to_list(cursor.fetchall())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM pre_registros WHERE id_estudiante = %s ORDER BY fecha_registro DESC", (student_id,))
+        pre_registros = rows_to_list(cursor.fetchall())
     # Convertir datetime a string en todos los pre-registros
     for pr in pre_registros:
         if 'fecha_registro' in pr and isinstance(pr['fecha_registro'], datetime):
@@ -249,96 +282,67 @@ def get_student_pre_registros_db(student_id):
 # ==================== ESTUDIANTES ====================
 
 def get_all_students():
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM students ORDER BY matricula")
-    students = rows_to_list(cursor.fetchall())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM students ORDER BY matricula")
+        students = rows_to_list(cursor.fetchall())
     return students
 
+def count_students():
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS count FROM students")
+        result = cursor.fetchone()
+    return int(row_to_dict(result)["count"])
+
 def get_student_by_matricula(matricula):
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM students WHERE matricula = %s", (matricula,))
-    student = cursor.fetchone()
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM students WHERE matricula = %s", (matricula,))
+        student = cursor.fetchone()
     return row_to_dict(student) if student else None
 
 def create_student(student_data):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Verificar si ya existe
-    cursor.execute("SELECT id FROM students WHERE matricula = %s", (student_data['matricula'],))
-    if cursor.fetchone():
-        conn.close()
-        return None
-    
-    student_id = str(uuid.uuid4())
-    
-    cursor.execute('''
-        INSERT INTO students (id, matricula, nombre, carrera, semestre, email)
-        VALUES (%s, %s, %s, %s, %s, %s)
-    ''', (
-        student_id, student_data['matricula'], student_data['nombre'],
-        student_data.get('carrera'), student_data.get('semestre'),
-        student_data.get('email')
-    ))
-    conn.commit()
-    
-    cursor.execute("SELECT * FROM students WHERE id = %s", (student_id,))
-    new_student = row_to_dict(cursor.fetchone())
-    conn.close()
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        
+        # Verificar si ya existe
+        cursor.execute("SELECT id FROM students WHERE matricula = %s", (student_data['matricula'],))
+        if cursor.fetchone():
+            return None
+        
+        student_id = str(uuid.uuid4())
+        
+        cursor.execute('''
+            INSERT INTO students (id, matricula, nombre, carrera, semestre, email)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        ''', (
+            student_id, student_data['matricula'], student_data['nombre'],
+            student_data.get('carrera'), student_data.get('semestre'),
+            student_data.get('email')
+        ))
+        conn.commit()
+        
+        cursor.execute("SELECT * FROM students WHERE id = %s", (student_id,))
+        new_student = row_to_dict(cursor.fetchone())
     return new_student
 
-def import_students_bulk(students_list):
-    conn = get_connection()
-    cursor = conn.cursor()
-    imported_count = 0
-    
-    for student_data in students_list:
-        try:
-            # Verificar si ya existe
-            cursor.execute("SELECT id FROM students WHERE matricula = %s", (student_data['matricula'],))
-            if not cursor.fetchone():
-                student_id = str(uuid.uuid4())
-                cursor.execute('''
-                    INSERT INTO students (id, matricula, nombre, carrera, semestre, email)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                ''', (
-                    student_id, student_data['matricula'], student_data['nombre'],
-                    student_data.get('carrera'), student_data.get('semestre'),
-                    student_data.get('email')
-                ))
-                imported_count += 1
-        except Exception as e:
-            print(f"Error importando estudiante {student_data.get('matricula')}: {e}")
-    
-    conn.commit()
-    conn.close()
-    return imported_count
-
 # ==================== ESTADÍSTICAS ====================
 
 def get_event_statistics(event_id):
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Obtener evento
-    cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
-    event = row_to_dict(cursor.fetchone())
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        # Los contadores se mantienen en cada escritura: una sola lectura
+        cursor.execute('''
+            SELECT nombre, capacidad_maxima, total_asistencias, asistencias_validadas
+            FROM events WHERE id = %s
+        ''', (event_id,))
+        event = cursor.fetchone()
     if not event:
-        conn.close()
         return None
-    
-    # Contar asistencias
-    cursor.execute("SELECT COUNT(*) as total FROM attendances WHERE id_evento = %s", (event_id,))
-    total_attendances = cursor.fetchone()[0]
-    
-    cursor.execute("SELECT COUNT(*) as validated FROM attendances WHERE id_evento = %s AND validado = 1", (event_id,))
-    validated_attendances = cursor.fetchone()[0]
-    
-    conn.close()
+    event = row_to_dict(event)
+    total_attendances = event["total_asistencias"]
+    validated_attendances = event["asistencias_validadas"]
     
     return {
         "event_id": event_id,
@@ -0,0 +1,161 @@
+"""
+Índice en memoria del padrón de estudiantes para events-service
+El escáner busca la matrícula antes de cada registro de asistencia; el padrón
+completo cabe en memoria, así que las búsquedas se resuelven sin ir a la base.
+Las matrículas de 5 dígitos se ubican con una tabla de 100,000 posiciones
+(array de enteros) que apunta a la lista de estudiantes; las demás, con un dict.
+"""
+import asyncio
+import logging
+import os
+import time
+from array import array
+from typing import Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+from database import get_db_connection, row_to_dict
+
+logger = logging.getLogger(__name__)
+
+# false: cada búsqueda consulta la base de datos (comportamiento anterior)
+STUDENT_INDEX_ENABLED = os.getenv("STUDENT_INDEX_ENABLED", "true").lower() == "true"
+# Recarga periódica (segundos, 0 desactiva): importaciones hechas por otro worker o por el script
+STUDENT_INDEX_REFRESH_SECONDS = int(os.getenv("STUDENT_INDEX_REFRESH_SECONDS", "300"))
+
+_SLOTS = 100000
+# Tope de matrículas inexistentes recordadas por instantánea (lecturas basura del escáner)
+_MAX_MISSES = 10000
+_FIELDS = ("id", "matricula", "nombre", "carrera", "semestre", "email", "activo")
+
+def _student(row) -> dict:
+    student = row_to_dict(row)
+    # BOOLEAN en PostgreSQL, INTEGER en SQLite
+    student["activo"] = bool(int(student["activo"])) if student.get("activo") is not None else True
+    return student
+
+class StudentIndex:
+    """Instantánea inmutable del padrón; se reemplaza completa en cada recarga."""
+
+    def __init__(self, rows):
+        self._records = []
+        self._slots = array("i", [-1]) * _SLOTS
+        self._others = {}
+        for row in rows:
+            student = _student(row)
+            matricula = student["matricula"]
+            position = len(self._records)
+            self._records.append(tuple(student[field] for field in _FIELDS))
+            if len(matricula) == 5 and matricula.isdigit():
+                self._slots[int(matricula)] = position
+            else:
+                self._others[matricula] = position
+        # Matrículas que tampoco estaban en la base: no se vuelven a consultar hasta la recarga
+        self._misses = set()
+        self.loaded_at = time.time()
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, matricula: str) -> Optional[dict]:
+        if len(matricula) == 5 and matricula.isdigit():
+            position = self._slots[int(matricula)]
+        else:
+            position = self._others.get(matricula, -1)
+        if position < 0:
+            return None
+        return dict(zip(_FIELDS, self._records[position]))
+
+    def is_miss(self, matricula: str) -> bool:
+        return matricula in self._misses
+
+    def add_miss(self, matricula: str):
+        if len(self._misses) >= _MAX_MISSES:
+            self._misses.clear()
+        self._misses.add(matricula)
+
+_index: Optional[StudentIndex] = None
+_refresh_task: Optional[asyncio.Task] = None
+
+def _query_student(matricula: str) -> Optional[dict]:
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"SELECT {', '.join(_FIELDS)} FROM students WHERE matricula = %s", (matricula,))
+        row = cursor.fetchone()
+    return _student(row) if row else None
+
+def refresh_student_index() -> bool:
+    """Recarga el índice desde la base. Si falla, se conserva el índice anterior."""
+    global _index
+    if not STUDENT_INDEX_ENABLED:
+        return False
+    start = time.perf_counter()
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(_FIELDS)} FROM students")
+            index = StudentIndex(cursor.fetchall())
+    except Exception as e:
+        logger.error(f"Error cargando el índice de estudiantes: {str(e)}")
+        return False
+    # Asignación atómica: las búsquedas en curso terminan con la instantánea anterior
+    _index = index
+    logger.info(f"Índice de estudiantes cargado: {len(index)} en {time.perf_counter() - start:.2f}s")
+    return True
+
+def _lookup(matricula: str) -> Optional[dict]:
+    index = _index
+    if index is None:
+        return _query_student(matricula)
+    student = index.get(matricula)
+    if student is not None or index.is_miss(matricula):
+        return student
+    student = _query_student(matricula)
+    if student is None:
+        index.add_miss(matricula)
+    return student
+
+def find_student(matricula: str) -> Optional[dict]:
+    """Estudiante activo por matrícula desde el índice; None si no está o fue dado de baja.
+
+    Sin índice cargado, o si la matrícula no está (pudo importarse en otro
+    worker después de la última recarga), se consulta la base de datos una vez:
+    si tampoco está, la matrícula se recuerda como inexistente hasta la siguiente
+    recarga del índice.
+    """
+    student = _lookup(matricula)
+    if student is None or not student["activo"]:
+        return None
+    return student
+
+def student_index_stats() -> dict:
+    index = _index
+    if index is None:
+        return {"enabled": STUDENT_INDEX_ENABLED, "loaded": False}
+    return {
+        "enabled": True,
+        "loaded": True,
+        "students": len(index),
+        "misses": len(index._misses),
+        "age_seconds": round(time.time() - index.loaded_at, 1),
+    }
+
+async def _refresh_periodically():
+    while True:
+        await asyncio.sleep(STUDENT_INDEX_REFRESH_SECONDS)
+        await run_in_threadpool(refresh_student_index)
+
+async def start_student_index():
+    """Carga inicial en el startup y, si está configurada, la recarga periódica."""
+    global _refresh_task
+    if not STUDENT_INDEX_ENABLED:
+        return
+    await run_in_threadpool(refresh_student_index)
+    if STUDENT_INDEX_REFRESH_SECONDS > 0:
+        _refresh_task = asyncio.get_running_loop().create_task(_refresh_periodically())
+
+def stop_student_index():
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        _refresh_task = None
@@ -11,7 +11,8 @@ CREATE TABLE IF NOT EXISTS users (
     password TEXT NOT NULL,
     full_name TEXT,
     role TEXT NOT NULL CHECK(role IN ('admin', 'encargado', 'estudiante')),
-    created_at TIMESTAMP NOT NULL DEFAULT NOW()
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    token_version INTEGER NOT NULL DEFAULT 0
 );
 
 -- Tabla de eventos
@@ -28,6 +29,9 @@ CREATE TABLE IF NOT EXISTS events (
     imagen_url TEXT,
     created_at TIMESTAMP NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    total_asistencias INTEGER NOT NULL DEFAULT 0,
+    asistencias_validadas INTEGER NOT NULL DEFAULT 0,
+    total_preregistros INTEGER NOT NULL DEFAULT 0,
     FOREIGN KEY (organizador_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -38,7 +42,9 @@ CREATE TABLE IF NOT EXISTS students (
     nombre TEXT NOT NULL,
     carrera TEXT,
     semestre INTEGER,
-    email TEXT
+    email TEXT,
+    content_hash TEXT,
+    activo BOOLEAN NOT NULL DEFAULT TRUE
 );
 
 -- Tabla de pre-registros
@@ -70,6 +76,10 @@ CREATE INDEX IF NOT EXISTS idx_events_fecha ON events(fecha_hora_inicio);
 CREATE INDEX IF NOT EXISTS idx_attendances_evento ON attendances(id_evento);
 CREATE INDEX IF NOT EXISTS idx_attendances_validado ON attendances(validado);
 CREATE INDEX IF NOT EXISTS idx_attendances_credencial ON attendances(id_credencial);
+-- Reportes: búsqueda por prefijo de matrícula (LIKE '123%') y paginación por hora_registro
+CREATE INDEX IF NOT EXISTS idx_attendances_credencial_prefix ON attendances(id_credencial text_pattern_ops);
+CREATE INDEX IF NOT EXISTS idx_attendances_hora ON attendances(hora_registro, id);
+CREATE INDEX IF NOT EXISTS idx_attendances_evento_hora ON attendances(id_evento, hora_registro);
 CREATE INDEX IF NOT EXISTS idx_pre_registros_evento ON pre_registros(id_evento);
 CREATE INDEX IF NOT EXISTS idx_pre_registros_matricula ON pre_registros(matricula);
 CREATE INDEX IF NOT EXISTS idx_students_matricula ON students(matricula);
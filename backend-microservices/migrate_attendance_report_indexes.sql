@@ -0,0 +1,20 @@
+-- ============================================
+-- Script de migración: índices del reporte de asistencias
+-- ============================================
+-- Ejecutar SOLO si ya tienes una base de datos creada antes de los filtros
+-- y la paginación por hora_registro del reporte de asistencias.
+-- Para bases de datos nuevas, este script NO es necesario.
+-- En SQLite basta con ejecutar init_database.py (crea los índices).
+
+-- Para PostgreSQL (Supabase)
+-- Búsqueda por prefijo de matrícula (LIKE '123%')
+CREATE INDEX IF NOT EXISTS idx_attendances_credencial_prefix ON attendances(id_credencial text_pattern_ops);
+-- Paginación keyset por hora_registro, con y sin filtro de evento
+CREATE INDEX IF NOT EXISTS idx_attendances_hora ON attendances(hora_registro, id);
+CREATE INDEX IF NOT EXISTS idx_attendances_evento_hora ON attendances(id_evento, hora_registro);
+
+-- Actualizar estadísticas para que el planificador use los índices nuevos
+ANALYZE attendances;
+
+-- Verificar que la migración fue exitosa
+SELECT indexname FROM pg_indexes WHERE tablename = 'attendances' ORDER BY indexname;
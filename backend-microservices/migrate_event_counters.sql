@@ -0,0 +1,26 @@
+-- ============================================
+-- Script de migración: contadores por evento
+-- ============================================
+-- Ejecutar SOLO si ya tienes una base de datos creada sin las columnas
+-- total_asistencias / asistencias_validadas / total_preregistros.
+-- Para bases de datos nuevas, este script NO es necesario.
+-- En SQLite basta con ejecutar init_database.py (agrega las columnas)
+-- y después reconcile_counters.py.
+
+-- Para PostgreSQL (Supabase)
+ALTER TABLE events ADD COLUMN IF NOT EXISTS total_asistencias INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS asistencias_validadas INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE events ADD COLUMN IF NOT EXISTS total_preregistros INTEGER NOT NULL DEFAULT 0;
+
+-- Rellenar los contadores con los datos existentes
+UPDATE events SET
+    total_asistencias = (
+        SELECT COUNT(*) FROM attendances a WHERE a.id_evento = events.id),
+    asistencias_validadas = (
+        SELECT COUNT(*) FROM attendances a
+        WHERE a.id_evento = events.id AND CAST(a.validado AS INTEGER) = 1),
+    total_preregistros = (
+        SELECT COUNT(*) FROM pre_registros p WHERE p.id_evento = events.id);
+
+-- Verificar que la migración fue exitosa
+SELECT id, nombre, total_asistencias, asistencias_validadas, total_preregistros FROM events LIMIT 5;
@@ -0,0 +1,17 @@
+-- ============================================
+-- Script de migración: sincronización incremental del padrón
+-- ============================================
+-- Ejecutar SOLO si ya tienes una base de datos creada sin las columnas
+-- students.content_hash / students.activo.
+-- Para bases de datos nuevas, este script NO es necesario.
+-- En SQLite basta con ejecutar init_database.py (agrega las columnas).
+
+-- Para PostgreSQL (Supabase)
+ALTER TABLE students ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE students ADD COLUMN IF NOT EXISTS activo BOOLEAN NOT NULL DEFAULT TRUE;
+
+-- content_hash queda vacío: la primera sincronización reescribe cada estudiante
+-- una vez y desde entonces solo se escriben los cambios.
+
+-- Verificar que la migración fue exitosa
+SELECT matricula, nombre, content_hash, activo FROM students LIMIT 5;
@@ -0,0 +1,15 @@
+-- ============================================
+-- Script de migración: versión de tokens por usuario
+-- ============================================
+-- Ejecutar SOLO si ya tienes una base de datos creada sin la columna
+-- users.token_version.
+-- Para bases de datos nuevas, este script NO es necesario.
+-- En SQLite basta con ejecutar init_database.py (agrega la columna).
+
+-- Para PostgreSQL (Supabase)
+-- Se incrementa al cambiar la contraseña: los tokens emitidos con una
+-- versión anterior dejan de ser válidos en todos los servicios.
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
+
+-- Verificar que la migración fue exitosa
+SELECT id, username, token_version FROM users LIMIT 5;
@@ -0,0 +1,19 @@
+"""
+Script para reconstruir los contadores por evento
+(total_asistencias, asistencias_validadas, total_preregistros)
+Uso: python reconcile_counters.py [id_evento]
+"""
+import sys
+from database import reconcile_event_counters
+
+if __name__ == "__main__":
+    event_id = sys.argv[1] if len(sys.argv) > 1 else None
+    
+    print("=" * 60)
+    print("RECONCILIACIÓN DE CONTADORES POR EVENTO")
+    print("=" * 60)
+    print()
+    
+    updated = reconcile_event_counters(event_id)
+    
+    print(f"✓ Eventos corregidos: {updated}")
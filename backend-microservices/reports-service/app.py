@@ -1,13 +1,11 @@
 from fastapi import FastAPI, HTTPException, Depends, status, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, Response
-from pydantic import BaseModel
-from typing import List, Optional
+from fastapi.security import HTTPAuthorizationCredentials
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
+from fastapi.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
 from datetime import datetime
-import json
-import io
-import csv
 import httpx
 import sys
 import os
@@ -15,7 +13,25 @@ from dotenv import load_dotenv
 
 # Agregar path para importar database
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection
+from database import DatabaseBusyError, configure, get_connection, release_connection
+from auth import security, verify_token, router as auth_router, start_token_version_sync, stop_token_version_sync
+from report_queries import (
+    count_pre_registros_db, decode_cursor, encode_cursor, get_event_attendees_db, get_event_db,
+    get_events_report_db, get_global_statistics_db, iter_attendance_analytics_db, iter_attendances_db,
+    iter_events_report_db, query_attendances_db
+)
+from exporters import (
+    ARROW_FORMATS, ATTENDANCE_ANALYTICS_FIELDS, arrow_chunks, csv_chunks, export_headers,
+    gzip_chunks, json_array_chunks, ndjson_chunks, zip_chunks
+)
+from jobs import (
+    delete_job, get_job, list_jobs, result_path, run_on_loop, shutdown_jobs, start_jobs, submit_job
+)
+from pdf_renderer import get_cached_pdf, pdf_cache_key, render_event_pdf_cached, shutdown_executor, start_executor
+from events_client import (
+    close_client, get_attendances_by_event, get_client, get_event_data, get_events_data,
+    partial_failure_headers
+)
 
 app = FastAPI(title="Reports Service - Sistema de Asistencias")
 
@@ -23,6 +39,9 @@ app = FastAPI(title="Reports Service - Sistema de Asistencias")
 ENV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
 load_dotenv(dotenv_path=ENV_PATH)
 
+# Parámetros de pool y conexión propios de este servicio (REPORTS_DB_*)
+configure(service="reports")
+
 # Configurar CORS dinámicamente
 allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "*")
 if allowed_origins_str == "*":
@@ -38,10 +57,39 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-security = HTTPBearer()
+# Pool de base de datos agotado: 503 para que el cliente reintente, en lugar de abrir más conexiones
+@app.exception_handler(DatabaseBusyError)
+async def database_busy_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Base de datos ocupada, intenta de nuevo"},
+        headers={"Retry-After": "1"}
+    )
+
+# Endpoint interno de revocación de tokens cacheados
+app.include_router(auth_router)
+
 USERS_SERVICE_URL = os.getenv("USERS_SERVICE_URL", "http://localhost:8101")
 EVENTS_SERVICE_URL = os.getenv("EVENTS_SERVICE_URL", "http://localhost:8102")
 
+# database: totales calculados en la base compartida; http: se piden a events-service
+# (despliegues donde reports-service no comparte la base de datos)
+DATA_SOURCE = os.getenv("REPORTS_DATA_SOURCE", "database").lower()
+
+@app.on_event("startup")
+async def startup_client():
+    get_client()
+    start_jobs()
+    start_executor()
+    start_token_version_sync()
+
+@app.on_event("shutdown")
+async def shutdown_client():
+    await close_client()
+    shutdown_executor()
+    shutdown_jobs()
+    stop_token_version_sync()
+
 class AttendanceReport(BaseModel):
     id: str
     id_credencial: str
@@ -67,72 +115,52 @@ class ReportFilters(BaseModel):
     fecha_fin: Optional[str] = None
     validado: Optional[bool] = None
     search_term: Optional[str] = None
+    # Paginación keyset: tamaño de página y cursor devuelto por la página anterior
+    limit: Optional[int] = Field(None, ge=1, le=500)
+    cursor: Optional[str] = None
+    include_total: bool = False
 
-async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.post(
-                f"{USERS_SERVICE_URL}/api/users/verify-token",
-                headers={"Authorization": f"Bearer {credentials.credentials}"}
-            )
-            if response.status_code == 200:
-                return response.json()
-            else:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Token inválido"
-                )
-    except httpx.TimeoutException:
-        raise HTTPException(
-            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
-            detail="Timeout al verificar token"
-        )
-    except httpx.RequestError as e:
-        raise HTTPException(
-            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=f"Servicio de usuarios no disponible: {str(e)}"
-        )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error inesperado: {str(e)}"
-        )
+class AttendancePage(BaseModel):
+    items: List[AttendanceReport]
+    next_cursor: Optional[str] = None
+    total: Optional[int] = None
 
-async def get_events_data(token: str):
-    try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(
-                f"{EVENTS_SERVICE_URL}/api/events",
-                headers={"Authorization": f"Bearer {token}"}
-            )
-            if response.status_code == 200:
-                return response.json()
-            return []
-    except (httpx.TimeoutException, httpx.RequestError, Exception) as e:
-        print(f"Error obteniendo eventos: {str(e)}")
-        return []
-
-async def get_event_attendances(event_id: str, token: str):
+def paginate_attendances(attendances: list, filters: ReportFilters):
+    """Paginación keyset en memoria (modo http), mismo orden y cursor que en SQL."""
+    attendances.sort(key=lambda a: (a["hora_registro"], a["id"]), reverse=True)
+    total = len(attendances) if filters.include_total else None
+    if filters.cursor:
+        position = tuple(decode_cursor(filters.cursor))
+        attendances = [a for a in attendances if (a["hora_registro"], a["id"]) < position]
+    next_cursor = None
+    if filters.limit and len(attendances) > filters.limit:
+        attendances = attendances[:filters.limit]
+        next_cursor = encode_cursor(attendances[-1]["hora_registro"], attendances[-1]["id"])
+    return attendances, next_cursor, total
+
+async def collect_attendances(filters: ReportFilters, token: str):
+    """Asistencias filtradas y paginadas.
+
+    Devuelve (asistencias, siguiente cursor, total, errores por evento).
+    """
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            response = await client.get(
-                f"{EVENTS_SERVICE_URL}/api/events/{event_id}/attendances",
-                headers={"Authorization": f"Bearer {token}"}
+        for fecha in (filters.fecha_inicio, filters.fecha_fin):
+            if fecha:
+                datetime.fromisoformat(fecha)
+        if DATA_SOURCE != "http":
+            # Filtros y paginación en SQL: solo viajan las filas de la página
+            attendances, next_cursor, total = await run_in_threadpool(
+                query_attendances_db, filters, filters.limit, filters.cursor, filters.include_total
             )
-            if response.status_code == 200:
-                return response.json()
-            return []
-    except (httpx.TimeoutException, httpx.RequestError, Exception) as e:
-        print(f"Error obteniendo asistencias del evento {event_id}: {str(e)}")
-        return []
+            return attendances, next_cursor, total, {}
+        
+        attendances, failures = await collect_attendances_http(filters, token)
+        return (*paginate_attendances(attendances, filters), failures)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
-@app.post("/api/reports/attendances", response_model=List[AttendanceReport])
-async def get_attendances_report(
-    filters: ReportFilters,
-    credentials: HTTPAuthorizationCredentials = Depends(security),
-    token_data: dict = Depends(verify_token)
-):
-    token = credentials.credentials
+async def collect_attendances_http(filters: ReportFilters, token: str):
+    """Asistencias filtradas pidiéndolas a events-service. Devuelve (asistencias, errores por evento)."""
     events = await get_events_data(token)
     
     all_attendances = []
@@ -142,10 +170,11 @@ async def get_attendances_report(
     else:
         target_events = events
     
+    # Todas las peticiones en paralelo (acotadas) en lugar de una tras otra
+    attendances_by_event, failures = await get_attendances_by_event([e["id"] for e in target_events], token)
+    
     for event in target_events:
-        attendances = await get_event_attendances(event["id"], token)
-        
-        for attendance in attendances:
+        for attendance in attendances_by_event.get(event["id"], []):
             attendance_report = {
                 "id": attendance["id"],
                 "id_credencial": attendance["id_credencial"],
@@ -181,23 +210,54 @@ async def get_attendances_report(
             or search_lower in a["nombre_evento"].lower()
         ]
     
-    return all_attendances
+    return all_attendances, failures
 
-@app.get("/api/reports/events", response_model=List[EventReport])
-async def get_events_report(
-    estado: Optional[str] = Query(None),
+def pagination_headers(next_cursor: Optional[str], total: Optional[int]):
+    headers = {}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    if total is not None:
+        headers["X-Total-Count"] = str(total)
+    return headers
+
+@app.post("/api/reports/attendances", response_model=List[AttendanceReport])
+async def get_attendances_report(
+    filters: ReportFilters,
+    response: Response,
     credentials: HTTPAuthorizationCredentials = Depends(security),
     token_data: dict = Depends(verify_token)
 ):
-    token = credentials.credentials
-    events = await get_events_data(token)
+    attendances, next_cursor, total, failures = await collect_attendances(filters, credentials.credentials)
+    response.headers.update(pagination_headers(next_cursor, total))
+    response.headers.update(partial_failure_headers(failures))
+    return attendances
+
+@app.post("/api/reports/attendances/page", response_model=AttendancePage)
+async def get_attendances_page(
+    filters: ReportFilters,
+    response: Response,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    token_data: dict = Depends(verify_token)
+):
+    """Igual que /api/reports/attendances pero con la paginación en el cuerpo (50 filas por defecto)."""
+    if filters.limit is None:
+        filters.limit = 50
+    attendances, next_cursor, total, failures = await collect_attendances(filters, credentials.credentials)
+    response.headers.update(partial_failure_headers(failures))
+    return {"items": attendances, "next_cursor": next_cursor, "total": total}
+
+async def collect_events_report(estado: Optional[str], token: str):
+    """Eventos con sus totales. Devuelve (eventos, errores por evento)."""
+    if DATA_SOURCE != "http":
+        # Totales agrupados en SQL: una consulta en lugar de una petición por evento
+        return await run_in_threadpool(get_events_report_db, estado), {}
     
-    if estado:
-        events = [e for e in events if e["estado"] == estado]
+    events = await get_events_data(token, estado)
+    attendances_by_event, failures = await get_attendances_by_event([e["id"] for e in events], token)
     
     events_report = []
     for event in events:
-        attendances = await get_event_attendances(event["id"], token)
+        attendances = attendances_by_event.get(event["id"], [])
         validated = [a for a in attendances if a["validado"]]
         
         event_report = {
@@ -213,107 +273,177 @@ async def get_events_report(
         }
         events_report.append(event_report)
     
-    return events_report
+    return events_report, failures
+
+@app.get("/api/reports/events", response_model=List[EventReport])
+async def get_events_report(
+    response: Response,
+    estado: Optional[str] = Query(None),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    token_data: dict = Depends(verify_token)
+):
+    events, failures = await collect_events_report(estado, credentials.credentials)
+    response.headers.update(partial_failure_headers(failures))
+    return events
+
+def check_filter_dates(filters: ReportFilters):
+    """Valida las fechas antes de empezar a enviar una exportación (después ya no hay 400)."""
+    for fecha in (filters.fecha_inicio, filters.fecha_fin):
+        if fecha:
+            try:
+                datetime.fromisoformat(fecha)
+            except ValueError as e:
+                raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+async def stream_attendances(filters: ReportFilters, token: str):
+    """Asistencias filtradas como iterador, sin paginar. Devuelve (iterador, errores por evento)."""
+    if DATA_SOURCE != "http":
+        check_filter_dates(filters)
+        # Cursor del servidor: las filas se leen por lotes mientras se envían
+        return iter_attendances_db(filters), {}
+    
+    attendances, _, _, failures = await collect_attendances(filters, token)
+    return iter(attendances), failures
+
+ATTENDANCES_CSV_HEADER = [
+    "ID Asistencia",
+    "ID Credencial",
+    "Evento",
+    "Hora de Registro",
+    "Validado"
+]
+
+EVENTS_CSV_HEADER = [
+    "ID Evento",
+    "Nombre",
+    "Descripción",
+    "Fecha Inicio",
+    "Fecha Fin",
+    "Ubicación",
+    "Total Asistencias",
+    "Asistencias Validadas",
+    "Estado"
+]
+
+def attendance_csv_row(attendance: dict) -> list:
+    return [
+        attendance["id"],
+        attendance["id_credencial"],
+        attendance["nombre_evento"],
+        attendance["hora_registro"],
+        "Sí" if attendance["validado"] else "No"
+    ]
+
+def event_csv_row(event: dict) -> list:
+    return [
+        event["id"],
+        event["nombre"],
+        event["descripcion"] or "",
+        event["fecha_hora_inicio"],
+        event["fecha_hora_fin"] or "",
+        event["ubicacion"] or "",
+        event["total_asistencias"],
+        event["asistencias_validadas"],
+        event["estado"]
+    ]
 
 @app.post("/api/reports/export/attendances/csv")
 async def export_attendances_csv(
     filters: ReportFilters,
+    compress: bool = Query(False, alias="gzip"),
     credentials: HTTPAuthorizationCredentials = Depends(security),
     token_data: dict = Depends(verify_token)
 ):
-    attendances = await get_attendances_report(filters, credentials, token_data)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow([
-        "ID Asistencia",
-        "ID Credencial",
-        "Evento",
-        "Hora de Registro",
-        "Validado"
-    ])
-    
-    for attendance in attendances:
-        writer.writerow([
-            attendance["id"],
-            attendance["id_credencial"],
-            attendance["nombre_evento"],
-            attendance["hora_registro"],
-            "Sí" if attendance["validado"] else "No"
-        ])
-    
-    output.seek(0)
+    attendances, failures = await stream_attendances(filters, credentials.credentials)
+    
+    chunks = csv_chunks(ATTENDANCES_CSV_HEADER, attendances, attendance_csv_row)
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        gzip_chunks(chunks) if compress else chunks,
         media_type="text/csv",
         headers={
-            "Content-Disposition": f"attachment; filename=reporte_asistencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            **export_headers(f"reporte_asistencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", compress),
+            **partial_failure_headers(failures)
         }
     )
 
 @app.post("/api/reports/export/attendances/json")
 async def export_attendances_json(
     filters: ReportFilters,
+    format: Literal["array", "ndjson"] = Query("array"),
+    compact: bool = Query(False),
+    compress: bool = Query(False, alias="gzip"),
     credentials: HTTPAuthorizationCredentials = Depends(security),
     token_data: dict = Depends(verify_token)
 ):
-    attendances = await get_attendances_report(filters, credentials, token_data)
+    """Exporta asistencias como arreglo JSON (indentado o compacto) o NDJSON, por bloques."""
+    attendances, failures = await stream_attendances(filters, credentials.credentials)
     
-    json_data = json.dumps(attendances, indent=2, ensure_ascii=False)
+    if format == "ndjson":
+        chunks = ndjson_chunks(attendances)
+        media_type, extension = "application/x-ndjson", "ndjson"
+    else:
+        chunks = json_array_chunks(attendances, compact=compact)
+        media_type, extension = "application/json", "json"
     
     return StreamingResponse(
-        iter([json_data]),
-        media_type="application/json",
+        gzip_chunks(chunks) if compress else chunks,
+        media_type=media_type,
         headers={
-            "Content-Disposition": f"attachment; filename=reporte_asistencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+            **export_headers(f"reporte_asistencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}", compress),
+            **partial_failure_headers(failures)
         }
     )
 
+@app.post("/api/reports/export/attendances/columnar")
+async def export_attendances_columnar(
+    filters: ReportFilters,
+    format: Literal["parquet", "arrow"] = Query("parquet"),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    token_data: dict = Depends(verify_token)
+):
+    """Exporta asistencias con carrera/semestre del estudiante y datos del evento
+    como Parquet o Arrow IPC, escritos por lotes desde el cursor de la base.
+
+    Siempre lee la base compartida (la tabla students no se expone por HTTP).
+    """
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="PyArrow no está instalado"
+        )
+    
+    check_filter_dates(filters)
+    media_type, extension = ARROW_FORMATS[format]
+    
+    return StreamingResponse(
+        arrow_chunks(iter_attendance_analytics_db(filters), ATTENDANCE_ANALYTICS_FIELDS, format),
+        media_type=media_type,
+        headers=export_headers(f"asistencias_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}")
+    )
+
 @app.get("/api/reports/export/events/csv")
 async def export_events_csv(
     estado: Optional[str] = Query(None),
+    compress: bool = Query(False, alias="gzip"),
     credentials: HTTPAuthorizationCredentials = Depends(security),
     token_data: dict = Depends(verify_token)
 ):
-    events = await get_events_report(estado, credentials, token_data)
-    
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    writer.writerow([
-        "ID Evento",
-        "Nombre",
-        "Descripción",
-        "Fecha Inicio",
-        "Fecha Fin",
-        "Ubicación",
-        "Total Asistencias",
-        "Asistencias Validadas",
-        "Estado"
-    ])
+    if DATA_SOURCE != "http":
+        events, failures = iter_events_report_db(estado), {}
+    else:
+        events, failures = await collect_events_report(estado, credentials.credentials)
     
-    for event in events:
-        writer.writerow([
-            event["id"],
-            event["nombre"],
-            event["descripcion"] or "",
-            event["fecha_hora_inicio"],
-            event["fecha_hora_fin"] or "",
-            event["ubicacion"] or "",
-            event["total_asistencias"],
-            event["asistencias_validadas"],
-            event["estado"]
-        ])
-    
-    output.seek(0)
+    chunks = csv_chunks(EVENTS_CSV_HEADER, events, event_csv_row)
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        gzip_chunks(chunks) if compress else chunks,
         media_type="text/csv",
         headers={
-            "Content-Disposition": f"attachment; filename=reporte_eventos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            **export_headers(f"reporte_eventos_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv", compress),
+            **partial_failure_headers(failures)
         }
     )
 
@@ -322,38 +452,92 @@ async def get_global_statistics(
     credentials: HTTPAuthorizationCredentials = Depends(security),
     token_data: dict = Depends(verify_token)
 ):
-    token = credentials.credentials
-    events = await get_events_data(token)
-    
-    total_events = len(events)
-    active_events = len([e for e in events if e["estado"] == "activo"])
-    finalized_events = len([e for e in events if e["estado"] == "finalizado"])
-    
-    total_attendances = 0
-    total_pre_registros = 0
-    
-    # Obtener pre-registros de la base de datos
-    conn = get_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) as count FROM pre_registros")
-    result = cursor.fetchone()
-    # Usar dict key en lugar de índice para compatibilidad con dict_row
-    total_pre_registros = result['count'] if result else 0
+    failures = {}
     
-    for event in events:
-        attendances = await get_event_attendances(event["id"], token)
-        total_attendances += len(attendances)
+    if DATA_SOURCE != "http":
+        stats = await run_in_threadpool(get_global_statistics_db)
+    else:
+        token = credentials.credentials
+        events = await get_events_data(token)
+        attendances_by_event, failures = await get_attendances_by_event([e["id"] for e in events], token)
+        stats = {
+            "total_pre_registros": await run_in_threadpool(count_pre_registros_db),
+            "total_events": len(events),
+            "active_events": len([e for e in events if e["estado"] == "activo"]),
+            "finalized_events": len([e for e in events if e["estado"] == "finalizado"]),
+            "total_attendances": sum(len(a) for a in attendances_by_event.values())
+        }
     
-    conn.close()
+    total_events = stats["total_events"]
+    total_attendances = stats["total_attendances"]
     
-    return {
+    result = {
         "total_events": total_events,
-        "active_events": active_events,
-        "finalized_events": finalized_events,
-        "total_pre_registros": total_pre_registros,
+        "active_events": stats["active_events"],
+        "finalized_events": stats["finalized_events"],
+        "total_pre_registros": stats["total_pre_registros"],
         "total_attendances": total_attendances,
         "average_attendances_per_event": round(total_attendances / total_events, 2) if total_events > 0 else 0
     }
+    if failures:
+        # Totales incompletos: indicar qué eventos faltan
+        result["failed_events"] = failures
+    return result
+
+async def get_report_event(event_id: str, token: str) -> dict:
+    """Evento por id. 404 si no existe."""
+    if DATA_SOURCE != "http":
+        event = await run_in_threadpool(get_event_db, event_id)
+    else:
+        event = await get_event_data(event_id, token)
+    
+    if not event:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Evento no encontrado"
+        )
+    return event
+
+async def collect_event_attendees(event_id: str, token: str) -> List[dict]:
+    """Asistencias del evento con nombre y carrera del estudiante."""
+    if DATA_SOURCE != "http":
+        return await run_in_threadpool(get_event_attendees_db, event_id)
+    
+    attendances_by_event, failures = await get_attendances_by_event([event_id], token)
+    if failures:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"No se pudieron obtener las asistencias: {failures[event_id]}"
+        )
+    # events-service ya incluye el estudiante en cada asistencia
+    attendances = []
+    for att in attendances_by_event[event_id]:
+        student = att.get("estudiante") or {}
+        attendances.append({
+            "id_credencial": att["id_credencial"],
+            "hora_registro": att["hora_registro"],
+            "validado": att["validado"],
+            "nombre": student.get("nombre"),
+            "carrera": student.get("carrera")
+        })
+    return attendances
+
+async def build_event_pdf(event_id: str, token: str):
+    """Devuelve (evento, bytes del PDF, "hit"|"miss" según el cache de PDF)."""
+    event = await get_report_event(event_id, token)
+    attendances = await collect_event_attendees(event_id, token)
+    
+    # Sin cambios en el evento ni en los datos de sus asistentes se reutiliza el PDF
+    # (la consulta de asistentes es barata; lo caro es renderizar)
+    cache_key = pdf_cache_key(event, attendances)
+    pdf_bytes = get_cached_pdf(cache_key)
+    if pdf_bytes is not None:
+        return event, pdf_bytes, "hit"
+    pdf_bytes = await render_event_pdf_cached(cache_key, event, attendances)
+    return event, pdf_bytes, "miss"
+
+def pdf_filename(event: dict) -> str:
+    return f"reporte_{event['nombre'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
 
 @app.get("/api/reports/export/event/{event_id}/pdf")
 async def export_event_pdf(
@@ -362,119 +546,179 @@ async def export_event_pdf(
     token_data: dict = Depends(verify_token)
 ):
     try:
-        from reportlab.lib.pagesizes import letter
-        from reportlab.lib import colors
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.units import inch
-        from reportlab.pdfbase import pdfmetrics
-        from reportlab.pdfbase.ttfonts import TTFont
+        import reportlab  # noqa: F401
     except ImportError:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="ReportLab no está instalado"
         )
     
-    token = credentials.credentials
-    events = await get_events_data(token)
-    event = next((e for e in events if e["id"] == event_id), None)
-    
-    if not event:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Evento no encontrado"
-        )
-    
-    attendances = await get_event_attendances(event_id, token)
-    
-    # Buscar información de estudiantes en la base de datos
-    conn = get_connection()
-    cursor = conn.cursor()
-    
-    # Crear PDF
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter)
-    elements = []
-    styles = getSampleStyleSheet()
-    
-    # Título
-    title = Paragraph(f"<b>Reporte de Asistencia</b>", styles['Title'])
-    elements.append(title)
-    elements.append(Spacer(1, 0.2*inch))
-    
-    # Información del evento
-    event_info = Paragraph(f"<b>Evento:</b> {event['nombre']}<br/>"
-                          f"<b>Fecha:</b> {event['fecha_hora_inicio']}<br/>"
-                          f"<b>Ubicacion:</b> {event.get('ubicacion', 'N/A')}<br/>"
-                          f"<b>Total Asistencias:</b> {len(attendances)}", styles['Normal'])
-    elements.append(event_info)
-    elements.append(Spacer(1, 0.3*inch))
-    
-    # Tabla de asistencias
-    if attendances:
-        elements.append(Paragraph("<b>Lista de Asistencias</b>", styles['Heading2']))
-        elements.append(Spacer(1, 0.2*inch))
-        
-        attendance_data = [["#", "Matricula", "Nombre", "Carrera", "Hora"]]
-        
-        for idx, att in enumerate(attendances, 1):
-            matricula = att['id_credencial']
-            
-            # Buscar estudiante en la base de datos
-            cursor.execute("SELECT nombre, carrera FROM students WHERE matricula = %s", (matricula,))
-            student_row = cursor.fetchone()
-            
-            if student_row:
-                # student_row es un dict con dict_row de psycopg3
-                nombre = student_row.get('nombre') or student_row.get(0) or "N/A"
-                carrera = student_row.get('carrera') or student_row.get(1) or "N/A"
-            else:
-                nombre = "No registrado"
-                carrera = "N/A"
-            
-            attendance_data.append([
-                str(idx),
-                matricula,
-                nombre,
-                carrera,
-                att['hora_registro'][:16]
-            ])
-        
-        attendance_table = Table(attendance_data, colWidths=[0.4*inch, 1*inch, 2.2*inch, 1.8*inch, 1.2*inch])
-        attendance_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-            ('TOPPADDING', (0, 0), (-1, -1), 8),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')])
-        ]))
-        
-        elements.append(attendance_table)
-    else:
-        elements.append(Paragraph("No hay asistencias registradas.", styles['Normal']))
-    
-    conn.close()
-    
-    doc.build(elements)
-    buffer.seek(0)
-    pdf_bytes = buffer.getvalue()
+    event, pdf_bytes, cache_status = await build_event_pdf(event_id, credentials.credentials)
     
     return Response(
         content=pdf_bytes,
         media_type="application/pdf",
         headers={
-            "Content-Disposition": f"attachment; filename=reporte_{event['nombre'].replace(' ', '_')}_{datetime.now().strftime('%Y%m%d')}.pdf"
+            "Content-Disposition": f"attachment; filename={pdf_filename(event)}",
+            "X-Report-Cache": cache_status
         }
     )
 
+# ==================== TRABAJOS EN SEGUNDO PLANO ====================
+
+JOB_KINDS = {
+    # tipo: (extensión, tipo MIME)
+    "attendances_csv": ("csv", "text/csv"),
+    "attendances_json": ("json", "application/json"),
+    "attendances_ndjson": ("ndjson", "application/x-ndjson"),
+    "attendances_parquet": ("parquet", ARROW_FORMATS["parquet"][0]),
+    "events_csv": ("csv", "text/csv"),
+    "events_pdf": ("zip", "application/zip"),
+}
+
+# Eventos por trabajo events_pdf
+MAX_PDF_EVENTS = 200
+
+class ReportJobRequest(BaseModel):
+    kind: Literal[
+        "attendances_csv", "attendances_json", "attendances_ndjson",
+        "attendances_parquet", "events_csv", "events_pdf"
+    ]
+    filters: ReportFilters = Field(default_factory=ReportFilters)
+    estado: Optional[str] = None
+    event_ids: List[str] = Field(default_factory=list, max_length=MAX_PDF_EVENTS)
+
+class ReportJob(BaseModel):
+    id: str
+    kind: str
+    status: str
+    filename: str
+    size: Optional[int] = None
+    error: Optional[str] = None
+    created_at: str
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    expires_at: Optional[str] = None
+    download_url: Optional[str] = None
+
+def job_view(job: dict) -> dict:
+    view = {key: value for key, value in job.items() if key != "owner"}
+    if job["status"] == "completed":
+        view["download_url"] = f"/api/reports/jobs/{job['id']}/download"
+    return view
+
+def get_owned_job(job_id: str, token_data: dict) -> dict:
+    """Trabajo del usuario (o de cualquiera si es admin); 404 en otro caso."""
+    job = get_job(job_id)
+    if not job or (job["owner"] != token_data["user_id"] and token_data.get("role") != "admin"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Trabajo no encontrado")
+    return job
+
+def job_producer(request: ReportJobRequest, token: str):
+    """Función que genera el archivo del trabajo; corre en un hilo de trabajo."""
+    kind = request.kind
+    
+    if kind.startswith("attendances_"):
+        def produce():
+            if kind == "attendances_parquet":
+                rows = iter_attendance_analytics_db(request.filters)
+                return arrow_chunks(rows, ATTENDANCE_ANALYTICS_FIELDS, "parquet")
+            rows, _ = run_on_loop(stream_attendances(request.filters, token))
+            if kind == "attendances_json":
+                return json_array_chunks(rows)
+            if kind == "attendances_ndjson":
+                return ndjson_chunks(rows)
+            return csv_chunks(ATTENDANCES_CSV_HEADER, rows, attendance_csv_row)
+        return produce
+    
+    if kind == "events_csv":
+        def produce():
+            if DATA_SOURCE != "http":
+                events = iter_events_report_db(request.estado)
+            else:
+                events, _ = run_on_loop(collect_events_report(request.estado, token))
+            return csv_chunks(EVENTS_CSV_HEADER, events, event_csv_row)
+        return produce
+    
+    def pdf_files():
+        for event_id in request.event_ids:
+            try:
+                event, pdf_bytes, _ = run_on_loop(build_event_pdf(event_id, token))
+            except HTTPException as e:
+                raise HTTPException(status_code=e.status_code, detail=f"{e.detail}: {event_id}")
+            yield f"{event_id[:8]}_{pdf_filename(event)}", pdf_bytes
+    return lambda: zip_chunks(pdf_files())
+
+@app.post("/api/reports/jobs", response_model=ReportJob, status_code=status.HTTP_202_ACCEPTED)
+async def submit_report_job(
+    request: ReportJobRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    token_data: dict = Depends(verify_token)
+):
+    """Encola una exportación grande; consultar GET /api/reports/jobs/{id} hasta que termine."""
+    # Errores de los parámetros antes de encolar, no al terminar
+    check_filter_dates(request.filters)
+    if request.kind == "attendances_parquet":
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="PyArrow no está instalado")
+    if request.kind == "events_pdf":
+        if not request.event_ids:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="event_ids es requerido")
+        try:
+            import reportlab  # noqa: F401
+        except ImportError:
+            raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="ReportLab no está instalado")
+    
+    extension, media_type = JOB_KINDS[request.kind]
+    filename = f"{request.kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{extension}"
+    job = submit_job(
+        request.kind, token_data["user_id"], filename, media_type,
+        job_producer(request, credentials.credentials)
+    )
+    return job_view(job)
+
+@app.get("/api/reports/jobs", response_model=List[ReportJob])
+def list_report_jobs(token_data: dict = Depends(verify_token)):
+    return [job_view(job) for job in list_jobs(owner=token_data["user_id"])]
+
+@app.get("/api/reports/jobs/{job_id}", response_model=ReportJob)
+def get_report_job(job_id: str, token_data: dict = Depends(verify_token)):
+    return job_view(get_owned_job(job_id, token_data))
+
+@app.get("/api/reports/jobs/{job_id}/download")
+def download_report_job(job_id: str, token_data: dict = Depends(verify_token)):
+    job = get_owned_job(job_id, token_data)
+    if job["status"] != "completed":
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=job["error"] if job["status"] == "failed" else "El trabajo aún no termina"
+        )
+    path = result_path(job_id)
+    if job["expires_at"] < datetime.now().isoformat() or not os.path.exists(path):
+        delete_job(job_id)
+        raise HTTPException(status_code=status.HTTP_410_GONE, detail="El resultado ya expiró")
+    return FileResponse(path, media_type=job["media_type"], filename=job["filename"])
+
+@app.delete("/api/reports/jobs/{job_id}", status_code=status.HTTP_204_NO_CONTENT)
+def delete_report_job(job_id: str, token_data: dict = Depends(verify_token)):
+    get_owned_job(job_id, token_data)
+    delete_job(job_id)
+
 @app.get("/")
 def root():
     return {"service": "Reports Service", "version": "1.0", "status": "running"}
 
+def check_database():
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+    finally:
+        release_connection(conn)
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint para monitoreo"""
@@ -486,11 +730,8 @@ async def health_check():
     
     # Verificar base de datos
     try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT 1")
-        cursor.fetchone()
-        conn.close()
+        # En el threadpool: una base lenta o inaccesible no bloquea el event loop
+        await run_in_threadpool(check_database)
         health_status["checks"]["database"] = "connected"
     except Exception as e:
         health_status["status"] = "unhealthy"
@@ -505,9 +746,8 @@ async def health_check():
         health_status["checks"]["users_service"] = "unreachable"
     
     try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(f"{EVENTS_SERVICE_URL}/")
-            health_status["checks"]["events_service"] = "reachable" if response.status_code == 200 else "unreachable"
+        response = await get_client().get("/", timeout=5.0)
+        health_status["checks"]["events_service"] = "reachable" if response.status_code == 200 else "unreachable"
     except:
         health_status["checks"]["events_service"] = "unreachable"
     
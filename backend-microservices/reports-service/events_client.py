@@ -0,0 +1,111 @@
+"""
+Cliente de events-service para reports-service
+Un AsyncClient compartido y peticiones concurrentes acotadas por semáforo,
+para los despliegues donde reports-service no comparte la base de datos.
+"""
+import asyncio
+import os
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException, status
+
+EVENTS_SERVICE_URL = os.getenv("EVENTS_SERVICE_URL", "http://localhost:8102")
+
+# Timeout por petición (segundos) y peticiones simultáneas a events-service
+UPSTREAM_TIMEOUT = float(os.getenv("REPORTS_UPSTREAM_TIMEOUT", "15"))
+UPSTREAM_CONCURRENCY = int(os.getenv("REPORTS_UPSTREAM_CONCURRENCY", "10"))
+
+_client: Optional[httpx.AsyncClient] = None
+
+def get_client() -> httpx.AsyncClient:
+    """Devuelve el cliente compartido, creándolo si el startup aún no corrió."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=EVENTS_SERVICE_URL,
+            timeout=UPSTREAM_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=UPSTREAM_CONCURRENCY,
+                max_keepalive_connections=UPSTREAM_CONCURRENCY
+            )
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+async def _get_json(path: str, token: str, params: Optional[dict] = None):
+    response = await get_client().get(path, params=params, headers={"Authorization": f"Bearer {token}"})
+    response.raise_for_status()
+    return response.json()
+
+async def get_events_data(token: str, estado: Optional[str] = None) -> List[dict]:
+    """Lista de eventos. Sin ella no hay reporte posible: los errores se propagan como 502/504."""
+    # httpx codifica el valor; estado llega del query string del cliente
+    params = {"estado": estado} if estado else None
+    try:
+        return await _get_json("/api/events", token, params=params)
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Timeout obteniendo eventos")
+    except (httpx.HTTPStatusError, httpx.RequestError) as e:
+        print(f"Error obteniendo eventos: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="No se pudieron obtener los eventos")
+
+async def get_event_data(event_id: str, token: str) -> Optional[dict]:
+    """Un evento por id; None si events-service responde 404."""
+    try:
+        return await _get_json(f"/api/events/{event_id}", token)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == status.HTTP_404_NOT_FOUND:
+            return None
+        print(f"Error obteniendo evento {event_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="No se pudo obtener el evento")
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Timeout obteniendo el evento")
+    except httpx.RequestError as e:
+        print(f"Error obteniendo evento {event_id}: {str(e)}")
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="No se pudo obtener el evento")
+
+async def get_attendances_by_event(
+    event_ids: List[str], token: str
+) -> Tuple[Dict[str, List[dict]], Dict[str, str]]:
+    """Pide las asistencias de varios eventos en paralelo (máximo UPSTREAM_CONCURRENCY a la vez).
+
+    Devuelve (asistencias por evento, errores por evento); un evento que falla no
+    interrumpe a los demás.
+    """
+    semaphore = asyncio.Semaphore(UPSTREAM_CONCURRENCY)
+
+    async def fetch(event_id: str):
+        async with semaphore:
+            return await _get_json(f"/api/events/{event_id}/attendances", token)
+
+    results = await asyncio.gather(*(fetch(event_id) for event_id in event_ids), return_exceptions=True)
+
+    attendances: Dict[str, List[dict]] = {}
+    failures: Dict[str, str] = {}
+    for event_id, result in zip(event_ids, results):
+        if isinstance(result, httpx.TimeoutException):
+            failures[event_id] = "timeout"
+        elif isinstance(result, httpx.HTTPStatusError):
+            failures[event_id] = f"HTTP {result.response.status_code}"
+        elif isinstance(result, Exception):
+            failures[event_id] = str(result) or type(result).__name__
+        else:
+            attendances[event_id] = result
+    if failures:
+        print(f"Asistencias no disponibles para {len(failures)} de {len(event_ids)} eventos")
+    return attendances, failures
+
+def partial_failure_headers(failures: Dict[str, str]) -> Dict[str, str]:
+    """Headers que informan al cliente de un reporte incompleto."""
+    if not failures:
+        return {}
+    return {
+        "X-Report-Partial": "true",
+        "X-Report-Failed-Events": ",".join(failures)
+    }
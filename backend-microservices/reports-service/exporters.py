@@ -0,0 +1,173 @@
+"""
+Generadores de exportación para reports-service
+Escriben fila a fila y entregan bloques a StreamingResponse, con gzip opcional,
+para que las exportaciones grandes usen memoria constante.
+"""
+import csv
+import io
+import itertools
+import json
+import os
+import zipfile
+import zlib
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+# Bytes acumulados antes de entregar un bloque al cliente
+EXPORT_CHUNK_SIZE = int(os.getenv("REPORTS_EXPORT_CHUNK_SIZE", "65536"))
+# Filas por lote (row group en Parquet) en las exportaciones columnares
+ARROW_BATCH_ROWS = int(os.getenv("REPORTS_ARROW_BATCH_ROWS", "50000"))
+
+# Esquema de la exportación analítica (alias de tipos de pyarrow)
+ATTENDANCE_ANALYTICS_FIELDS = [
+    ("id", "string"),
+    ("id_credencial", "string"),
+    ("nombre_estudiante", "string"),
+    ("carrera", "string"),
+    ("semestre", "int32"),
+    ("id_evento", "string"),
+    ("nombre_evento", "string"),
+    ("estado_evento", "string"),
+    ("ubicacion", "string"),
+    ("fecha_hora_inicio", "timestamp[us]"),
+    ("hora_registro", "timestamp[us]"),
+    ("validado", "bool"),
+]
+
+# Tipo MIME y extensión por formato columnar
+ARROW_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+}
+
+def csv_chunks(header: List[str], rows: Iterable, to_row: Callable[[dict], list]) -> Iterator[bytes]:
+    """Genera el CSV en bloques de ~EXPORT_CHUNK_SIZE bytes (UTF-8)."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow(to_row(row))
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+def _buffered(pieces: Iterable[str]) -> Iterator[bytes]:
+    """Agrupa fragmentos de texto en bloques de ~EXPORT_CHUNK_SIZE bytes (UTF-8)."""
+    buffer = []
+    size = 0
+    for piece in pieces:
+        buffer.append(piece)
+        size += len(piece)
+        if size >= EXPORT_CHUNK_SIZE:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    if buffer:
+        yield "".join(buffer).encode("utf-8")
+
+def _json_array_pieces(rows: Iterable, compact: bool) -> Iterator[str]:
+    # Mismo texto que json.dumps(lista, indent=2), escrito elemento a elemento
+    if compact:
+        opening, separator, closing = "[", ",", "]"
+    else:
+        opening, separator, closing = "[\n  ", ",\n  ", "\n]"
+    first = True
+    for row in rows:
+        if compact:
+            item = json.dumps(row, ensure_ascii=False, separators=(",", ":"))
+        else:
+            item = json.dumps(row, ensure_ascii=False, indent=2).replace("\n", "\n  ")
+        yield (opening if first else separator) + item
+        first = False
+    yield "[]" if first else closing
+
+def json_array_chunks(rows: Iterable, compact: bool = False) -> Iterator[bytes]:
+    """Genera un arreglo JSON válido sin materializar la lista completa."""
+    return _buffered(_json_array_pieces(rows, compact))
+
+def ndjson_chunks(rows: Iterable) -> Iterator[bytes]:
+    """Genera NDJSON: un objeto compacto por línea."""
+    return _buffered(
+        json.dumps(row, ensure_ascii=False, separators=(",", ":")) + "\n" for row in rows
+    )
+
+class _ChunkSink(io.RawIOBase):
+    """Archivo en memoria que los writers de pyarrow llenan y que se vacía tras cada lote."""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+def arrow_chunks(rows: Iterable[dict], fields, format: str = "parquet") -> Iterator[bytes]:
+    """Escribe las filas como Parquet o Arrow IPC (stream), en lotes de ARROW_BATCH_ROWS.
+
+    Requiere pyarrow. Cada lote se convierte a RecordBatch y se entrega en cuanto se escribe.
+    """
+    import pyarrow as pa
+
+    schema = pa.schema([pa.field(name, pa.type_for_alias(alias)) for name, alias in fields])
+    names = [name for name, _ in fields]
+    sink = _ChunkSink()
+    if format == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, ARROW_BATCH_ROWS))
+        if not batch:
+            break
+        writer.write_batch(pa.RecordBatch.from_pylist(
+            [{name: row.get(name) for name in names} for row in batch], schema=schema
+        ))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+def zip_chunks(files: Iterable[Tuple[str, bytes]]) -> Iterator[bytes]:
+    """Empaqueta (nombre, contenido) en un ZIP, entregando cada archivo al agregarlo."""
+    sink = _ChunkSink()
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for name, content in files:
+            archive.writestr(name, content)
+            yield sink.drain()
+    yield sink.drain()
+
+def gzip_chunks(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Comprime un flujo de bloques en formato gzip sin acumularlo."""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31: cabecera gzip
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def export_headers(filename: str, compress: bool = False) -> dict:
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return headers
@@ -0,0 +1,175 @@
+"""
+Cola de trabajos de exportación para reports-service
+Las exportaciones grandes corren en hilos propios y escriben el resultado en disco;
+el cliente consulta el estado y descarga el archivo cuando está listo, sin
+depender del timeout del gateway.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, List, Optional
+
+# Directorio de resultados, hilos de trabajo y vigencia de cada resultado (segundos)
+JOBS_DIR = os.getenv("REPORTS_JOBS_DIR") or os.path.join(tempfile.gettempdir(), "reports-jobs")
+JOB_WORKERS = int(os.getenv("REPORTS_JOB_WORKERS", "2"))
+JOB_TTL = int(os.getenv("REPORTS_JOB_TTL", "3600"))
+# Cada cuánto se borran los resultados vencidos (segundos)
+JOB_PURGE_INTERVAL = int(os.getenv("REPORTS_JOB_PURGE_INTERVAL", "300"))
+# Espera máxima de un hilo de trabajo por una consulta hecha en el event loop (segundos)
+JOB_STEP_TIMEOUT = float(os.getenv("REPORTS_JOB_STEP_TIMEOUT", "600"))
+
+_executor: Optional[ThreadPoolExecutor] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_purge_task: Optional[asyncio.Task] = None
+# Escrituras de metadatos desde los hilos de trabajo
+_lock = threading.Lock()
+
+def _meta_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.json")
+
+def result_path(job_id: str) -> str:
+    return os.path.join(JOBS_DIR, f"{job_id}.result")
+
+def _now() -> str:
+    return datetime.now().isoformat()
+
+def _save(job: dict):
+    # Escritura atómica: un lector nunca ve un JSON a medias
+    tmp_path = _meta_path(job["id"]) + ".tmp"
+    with _lock:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+        os.replace(tmp_path, _meta_path(job["id"]))
+
+def get_job(job_id: str) -> Optional[dict]:
+    """Metadatos del trabajo (el disco es la fuente de verdad, válido con varios workers)."""
+    try:
+        with open(_meta_path(job_id), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def list_jobs(owner: Optional[str] = None) -> List[dict]:
+    """Trabajos del más reciente al más antiguo; filtrados por dueño si se indica."""
+    jobs = []
+    for name in os.listdir(JOBS_DIR):
+        if name.endswith(".json"):
+            job = get_job(name[:-len(".json")])
+            if job and (owner is None or job["owner"] == owner):
+                jobs.append(job)
+    return sorted(jobs, key=lambda job: job["created_at"], reverse=True)
+
+def delete_job(job_id: str):
+    for path in (result_path(job_id), result_path(job_id) + ".part", _meta_path(job_id)):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def purge_expired_jobs() -> int:
+    """Borra resultados y metadatos vencidos. Devuelve cuántos trabajos se borraron."""
+    now = _now()
+    purged = 0
+    for name in os.listdir(JOBS_DIR):
+        if not name.endswith(".json"):
+            continue
+        job = get_job(name[:-len(".json")])
+        if job and job["expires_at"] and job["expires_at"] < now:
+            delete_job(job["id"])
+            purged += 1
+    if purged:
+        print(f"Trabajos de exportación vencidos borrados: {purged}")
+    return purged
+
+def run_on_loop(coro):
+    """Ejecuta una corrutina en el event loop del servicio desde un hilo de trabajo."""
+    # Con timeout: si el loop se detiene (apagado) el hilo no queda esperando para siempre
+    return asyncio.run_coroutine_threadsafe(coro, _loop).result(timeout=JOB_STEP_TIMEOUT)
+
+def _run(job: dict, produce: Callable[[], Iterable[bytes]]):
+    job.update(status="running", started_at=_now())
+    _save(job)
+    part_path = result_path(job["id"]) + ".part"
+    try:
+        size = 0
+        with open(part_path, "wb") as f:
+            for chunk in produce():
+                f.write(chunk)
+                size += len(chunk)
+        os.replace(part_path, result_path(job["id"]))
+        job.update(status="completed", size=size)
+    except Exception as e:
+        print(f"Error en trabajo de exportación {job['id']}: {str(e)}")
+        try:
+            os.remove(part_path)
+        except FileNotFoundError:
+            pass
+        job.update(status="failed", error=getattr(e, "detail", None) or str(e) or type(e).__name__)
+    job.update(
+        finished_at=_now(),
+        expires_at=(datetime.now() + timedelta(seconds=JOB_TTL)).isoformat()
+    )
+    _save(job)
+
+def submit_job(kind: str, owner: str, filename: str, media_type: str,
+               produce: Callable[[], Iterable[bytes]]) -> dict:
+    """Encola un trabajo. produce() corre en un hilo de trabajo y genera los bytes del archivo."""
+    job = {
+        "id": str(uuid.uuid4()),
+        "kind": kind,
+        "owner": owner,
+        "status": "pending",
+        "filename": filename,
+        "media_type": media_type,
+        "size": None,
+        "error": None,
+        "created_at": _now(),
+        "started_at": None,
+        "finished_at": None,
+        "expires_at": None
+    }
+    _save(job)
+    _executor.submit(_run, job, produce)
+    return job
+
+async def _purge_periodically():
+    while True:
+        await asyncio.sleep(JOB_PURGE_INTERVAL)
+        try:
+            purge_expired_jobs()
+        except OSError as e:
+            print(f"Error borrando trabajos vencidos: {str(e)}")
+
+def start_jobs():
+    """Inicializa el pool en el startup. Los trabajos que quedaron a medias se marcan fallidos."""
+    global _executor, _loop, _purge_task
+    os.makedirs(JOBS_DIR, exist_ok=True)
+    _loop = asyncio.get_running_loop()
+    _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="report-job")
+    purge_expired_jobs()
+    # Con varios workers de uvicorn compartiendo JOBS_DIR, solo se marcan los
+    # trabajos viejos: uno reciente puede seguir corriendo en otro proceso
+    for job in list_jobs():
+        if job["status"] in ("pending", "running") and not job["expires_at"]:
+            started = datetime.fromisoformat(job["started_at"] or job["created_at"])
+            if datetime.now() - started > timedelta(seconds=JOB_TTL):
+                job.update(
+                    status="failed", error="Interrumpido por un reinicio del servicio", finished_at=_now(),
+                    expires_at=(datetime.now() + timedelta(seconds=JOB_TTL)).isoformat()
+                )
+                _save(job)
+    _purge_task = _loop.create_task(_purge_periodically())
+
+def shutdown_jobs():
+    global _executor, _purge_task
+    if _purge_task is not None:
+        _purge_task.cancel()
+        _purge_task = None
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -0,0 +1,178 @@
+"""
+Renderizado de reportes PDF para reports-service
+ReportLab es CPU-bound: doc.build corre en un pool de procesos acotado para no
+bloquear el event loop, y los PDF ya generados se guardan en un cache LRU.
+"""
+import asyncio
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.concurrency import run_in_threadpool
+
+# Procesos que renderizan PDF (0 = renderizar en el threadpool, sin procesos)
+PDF_WORKERS = int(os.getenv("REPORTS_PDF_WORKERS", "2"))
+# PDF renderizados que se conservan en memoria (0 desactiva el cache)
+PDF_CACHE_SIZE = int(os.getenv("REPORTS_PDF_CACHE_SIZE", "32"))
+
+_executor: Optional[ProcessPoolExecutor] = None
+_cache: "OrderedDict[tuple, bytes]" = OrderedDict()
+# Renderizados en curso: peticiones simultáneas del mismo PDF esperan el mismo resultado
+_pending: Dict[tuple, asyncio.Future] = {}
+
+def render_event_pdf(event: dict, attendances: List[dict]) -> bytes:
+    """Genera el PDF de asistencia de un evento (se ejecuta en un proceso del pool)."""
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    from reportlab.lib.units import inch
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Título
+    title = Paragraph(f"<b>Reporte de Asistencia</b>", styles['Title'])
+    elements.append(title)
+    elements.append(Spacer(1, 0.2*inch))
+
+    # Información del evento
+    event_info = Paragraph(f"<b>Evento:</b> {event['nombre']}<br/>"
+                          f"<b>Fecha:</b> {event['fecha_hora_inicio']}<br/>"
+                          f"<b>Ubicacion:</b> {event.get('ubicacion', 'N/A')}<br/>"
+                          f"<b>Total Asistencias:</b> {len(attendances)}", styles['Normal'])
+    elements.append(event_info)
+    elements.append(Spacer(1, 0.3*inch))
+
+    # Tabla de asistencias
+    if attendances:
+        elements.append(Paragraph("<b>Lista de Asistencias</b>", styles['Heading2']))
+        elements.append(Spacer(1, 0.2*inch))
+
+        attendance_data = [["#", "Matricula", "Nombre", "Carrera", "Hora"]]
+
+        for idx, att in enumerate(attendances, 1):
+            attendance_data.append([
+                str(idx),
+                att['id_credencial'],
+                att['nombre'] or "No registrado",
+                att['carrera'] or "N/A",
+                att['hora_registro'][:16]
+            ])
+
+        attendance_table = Table(attendance_data, colWidths=[0.4*inch, 1*inch, 2.2*inch, 1.8*inch, 1.2*inch])
+        attendance_table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4472C4')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+            ('TOPPADDING', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F2F2F2')])
+        ]))
+
+        elements.append(attendance_table)
+    else:
+        elements.append(Paragraph("No hay asistencias registradas.", styles['Normal']))
+
+    doc.build(elements)
+    return buffer.getvalue()
+
+def pdf_cache_key(event: dict, attendances: List[dict]) -> Tuple:
+    """Versión del PDF: cambia al editar el evento, registrar/validar asistencias
+    o corregir en el padrón los datos de algún asistente (nombre, carrera)."""
+    attendees = json.dumps(attendances, sort_keys=True, default=str).encode("utf-8")
+    return (
+        event["id"],
+        event.get("updated_at"),
+        event.get("estado"),
+        event.get("total_asistencias"),
+        event.get("asistencias_validadas"),
+        hashlib.sha1(attendees).hexdigest(),
+    )
+
+def get_cached_pdf(key: Tuple) -> Optional[bytes]:
+    pdf_bytes = _cache.get(key)
+    if pdf_bytes is not None:
+        _cache.move_to_end(key)
+    return pdf_bytes
+
+def _store_pdf(key: Tuple, pdf_bytes: bytes):
+    if PDF_CACHE_SIZE <= 0:
+        return
+    # Una sola versión por evento: las anteriores ya no se pedirán
+    for old_key in [k for k in _cache if k[0] == key[0]]:
+        del _cache[old_key]
+    _cache[key] = pdf_bytes
+    while len(_cache) > PDF_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: el proceso del servicio ya tiene hilos (pool PostgreSQL, DNS, jobs)
+        # y un fork copiaría sus locks tomados en los procesos de renderizado
+        _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return _executor
+
+def start_executor():
+    """Crea el pool de renderizado en el startup; después solo se recrea si se rompe."""
+    if PDF_WORKERS > 0:
+        get_executor()
+
+def shutdown_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+async def _render(event: dict, attendances: List[dict]) -> bytes:
+    global _executor
+    if PDF_WORKERS <= 0:
+        return await run_in_threadpool(render_event_pdf, event, attendances)
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_executor(), render_event_pdf, event, attendances)
+    except BrokenProcessPool:
+        # Un proceso murió (p.ej. sin memoria): recrear el pool y reintentar una vez
+        print("Pool de renderizado PDF roto, se recrea")
+        _executor = None
+        return await loop.run_in_executor(get_executor(), render_event_pdf, event, attendances)
+
+async def render_event_pdf_cached(key: Tuple, event: dict, attendances: List[dict]) -> bytes:
+    """PDF del evento desde el cache, o renderizado en el pool y guardado."""
+    pdf_bytes = get_cached_pdf(key)
+    if pdf_bytes is not None:
+        return pdf_bytes
+
+    pending = _pending.get(key)
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _pending[key] = future
+    try:
+        pdf_bytes = await _render(event, attendances)
+        _store_pdf(key, pdf_bytes)
+        future.set_result(pdf_bytes)
+        return pdf_bytes
+    except Exception as e:
+        future.set_exception(e)
+        # Evitar "Future exception was never retrieved" si nadie más esperaba
+        future.exception()
+        raise
+    except BaseException:
+        future.cancel()
+        raise
+    finally:
+        del _pending[key]
@@ -0,0 +1,255 @@
+"""
+Consultas agregadas para reports-service
+Los totales se calculan en SQL (GROUP BY) en lugar de pedir las asistencias
+de cada evento a events-service.
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database import get_db_connection, row_to_dict, rows_to_list, stream_rows
+from datetime import datetime
+import base64
+import json
+
+# validado es BOOLEAN en Supabase e INTEGER en SQLite: CAST funciona en ambos
+ATTENDANCE_TOTALS_SQL = '''
+    SELECT id_evento,
+           COUNT(*) AS total_asistencias,
+           SUM(CAST(validado AS INTEGER)) AS asistencias_validadas
+    FROM attendances
+    GROUP BY id_evento
+'''
+
+def _isoformat_fields(row, fields):
+    """Convierte campos datetime (PostgreSQL) a string ISO como en events-service."""
+    for field in fields:
+        if isinstance(row.get(field), datetime):
+            row[field] = row[field].isoformat()
+    return row
+
+def _events_report_query(estado=None):
+    query = f'''
+        SELECT e.id, e.nombre, e.descripcion, e.fecha_hora_inicio, e.fecha_hora_fin,
+               e.ubicacion, e.estado,
+               COALESCE(t.total_asistencias, 0) AS total_asistencias,
+               COALESCE(t.asistencias_validadas, 0) AS asistencias_validadas
+        FROM events e
+        LEFT JOIN ({ATTENDANCE_TOTALS_SQL}) t ON t.id_evento = e.id
+        {"WHERE e.estado = %s" if estado else ""}
+        ORDER BY e.created_at DESC
+    '''
+    return query, (estado,) if estado else ()
+
+def _event_report_row(event):
+    _isoformat_fields(event, ("fecha_hora_inicio", "fecha_hora_fin"))
+    event["total_asistencias"] = int(event["total_asistencias"])
+    event["asistencias_validadas"] = int(event["asistencias_validadas"])
+    return event
+
+def get_events_report_db(estado=None):
+    """Eventos con sus totales de asistencias en una sola consulta."""
+    query, params = _events_report_query(estado)
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        events = rows_to_list(cursor.fetchall())
+    return [_event_report_row(event) for event in events]
+
+def iter_events_report_db(estado=None):
+    """Como get_events_report_db pero fila a fila (exportaciones)."""
+    query, params = _events_report_query(estado)
+    for event in stream_rows(query, params):
+        yield _event_report_row(event)
+
+def get_global_statistics_db():
+    """Conteos globales de eventos, asistencias y pre-registros en una sola consulta."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT
+                (SELECT COUNT(*) FROM events) AS total_events,
+                (SELECT COUNT(*) FROM events WHERE estado = 'activo') AS active_events,
+                (SELECT COUNT(*) FROM events WHERE estado = 'finalizado') AS finalized_events,
+                (SELECT COUNT(*) FROM pre_registros) AS total_pre_registros,
+                (SELECT COUNT(*) FROM attendances) AS total_attendances
+        ''')
+        stats = row_to_dict(cursor.fetchone())
+    return {key: int(value or 0) for key, value in stats.items()}
+
+def count_pre_registros_db():
+    """Total de pre-registros (único dato global que no expone events-service)."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) AS count FROM pre_registros")
+        result = cursor.fetchone()
+    return int(row_to_dict(result)["count"]) if result else 0
+
+def get_event_db(event_id):
+    """Evento por id (None si no existe)."""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT * FROM events WHERE id = %s", (event_id,))
+        row = cursor.fetchone()
+    if not row:
+        return None
+    return _isoformat_fields(row_to_dict(row), ("fecha_hora_inicio", "fecha_hora_fin", "created_at", "updated_at"))
+
+def get_event_attendees_db(event_id):
+    """Asistencias del evento con nombre y carrera del estudiante (PDF).
+
+    El mismo cruce con students que hace events-service, en una sola consulta.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT a.id_credencial, a.hora_registro, a.validado, s.nombre, s.carrera
+            FROM attendances a
+            LEFT JOIN students s ON s.matricula = a.id_credencial
+            WHERE a.id_evento = %s
+            ORDER BY a.hora_registro DESC
+        ''', (event_id,))
+        attendances = rows_to_list(cursor.fetchall())
+    return [_isoformat_fields(attendance, ("hora_registro",)) for attendance in attendances]
+
+# ==================== ASISTENCIAS FILTRADAS ====================
+
+def encode_cursor(hora_registro, attendance_id):
+    """Cursor opaco para paginación keyset: (hora_registro, id) de la última fila."""
+    raw = json.dumps([hora_registro, attendance_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_cursor(cursor):
+    """Devuelve (hora_registro, id); ValueError si el cursor no es válido."""
+    try:
+        hora_registro, attendance_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("Cursor inválido")
+    return hora_registro, attendance_id
+
+def _escape_like(term):
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def build_attendance_filters(filters):
+    """Traduce ReportFilters a condiciones SQL que usan los índices de attendances."""
+    conditions = []
+    params = []
+    if filters.event_id:
+        conditions.append("a.id_evento = %s")
+        params.append(filters.event_id)
+    if filters.fecha_inicio:
+        conditions.append("a.hora_registro >= %s")
+        params.append(filters.fecha_inicio)
+    if filters.fecha_fin:
+        conditions.append("a.hora_registro <= %s")
+        params.append(filters.fecha_fin)
+    if filters.validado is not None:
+        # '1'/'0' sin tipo: PostgreSQL los convierte a BOOLEAN y SQLite a INTEGER
+        conditions.append("a.validado = %s")
+        params.append('1' if filters.validado else '0')
+    if filters.search_term:
+        # Prefijo de matrícula (usa el índice) o parte del nombre del evento
+        term = _escape_like(filters.search_term.strip().lower())
+        conditions.append("(a.id_credencial LIKE %s ESCAPE '\\' OR LOWER(e.nombre) LIKE %s ESCAPE '\\')")
+        params += [f"{term}%", f"%{term}%"]
+    return conditions, params
+
+ATTENDANCES_FROM = "FROM attendances a JOIN events e ON e.id = a.id_evento"
+
+def _attendances_query(filters, limit=None, cursor=None):
+    """SELECT de asistencias filtradas, de la más reciente a la más antigua."""
+    conditions, params = build_attendance_filters(filters)
+    if cursor:
+        hora_registro, attendance_id = decode_cursor(cursor)
+        conditions.append("(a.hora_registro < %s OR (a.hora_registro = %s AND a.id < %s))")
+        params += [hora_registro, hora_registro, attendance_id]
+    
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f'''
+        SELECT a.id, a.id_credencial, a.id_evento, e.nombre AS nombre_evento,
+               a.hora_registro, a.validado
+        {ATTENDANCES_FROM}
+        {where}
+        ORDER BY a.hora_registro DESC, a.id DESC
+    '''
+    if limit:
+        query += " LIMIT %s"
+        params.append(limit)
+    return query, params
+
+def _attendance_row(attendance):
+    _isoformat_fields(attendance, ("hora_registro",))
+    attendance["validado"] = bool(attendance["validado"])
+    return attendance
+
+def query_attendances_db(filters, limit=None, cursor=None, include_total=False):
+    """Asistencias filtradas en SQL, de la más reciente a la más antigua.
+
+    Con limit devuelve una página y el cursor de la siguiente (None si no hay más).
+    Devuelve (asistencias, siguiente_cursor, total); total es None si no se pidió.
+    """
+    # Una fila extra indica si existe página siguiente
+    query, params = _attendances_query(filters, limit + 1 if limit else None, cursor)
+    
+    total = None
+    with get_db_connection() as conn:
+        db_cursor = conn.cursor()
+        db_cursor.execute(query, params)
+        attendances = rows_to_list(db_cursor.fetchall())
+        if include_total:
+            conditions, count_params = build_attendance_filters(filters)
+            count_where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+            db_cursor.execute(f"SELECT COUNT(*) AS total {ATTENDANCES_FROM} {count_where}", count_params)
+            total = int(row_to_dict(db_cursor.fetchone())["total"])
+    
+    has_more = bool(limit) and len(attendances) > limit
+    if has_more:
+        attendances = attendances[:limit]
+    attendances = [_attendance_row(attendance) for attendance in attendances]
+
+    next_cursor = None
+    if has_more:
+        last = attendances[-1]
+        next_cursor = encode_cursor(last["hora_registro"], last["id"])
+    return attendances, next_cursor, total
+
+def iter_attendances_db(filters):
+    """Todas las asistencias filtradas, fila a fila desde un cursor del servidor."""
+    query, params = _attendances_query(filters)
+    for attendance in stream_rows(query, params):
+        yield _attendance_row(attendance)
+
+# ==================== ANALÍTICA (COLUMNAR) ====================
+
+def _to_datetime(value):
+    """TIMESTAMP de PostgreSQL o texto ISO de SQLite -> datetime."""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+def _analytics_row(row):
+    row["fecha_hora_inicio"] = _to_datetime(row["fecha_hora_inicio"])
+    row["hora_registro"] = _to_datetime(row["hora_registro"])
+    row["validado"] = bool(row["validado"])
+    return row
+
+def iter_attendance_analytics_db(filters):
+    """Asistencias con datos del estudiante (carrera, semestre) y del evento, fila a fila.
+
+    Los tipos quedan nativos (datetime, bool, int) para escribirlos en formato columnar.
+    """
+    conditions, params = build_attendance_filters(filters)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    query = f'''
+        SELECT a.id, a.id_credencial, s.nombre AS nombre_estudiante, s.carrera, s.semestre,
+               a.id_evento, e.nombre AS nombre_evento, e.estado AS estado_evento,
+               e.ubicacion, e.fecha_hora_inicio, a.hora_registro, a.validado
+        {ATTENDANCES_FROM}
+        LEFT JOIN students s ON s.matricula = a.id_credencial
+        {where}
+        ORDER BY a.hora_registro, a.id
+    '''
+    for row in stream_rows(query, params):
+        yield _analytics_row(row)
@@ -0,0 +1,432 @@
+"""
+Importación masiva del padrón de estudiantes
+Las columnas se resuelven una sola vez, los datos se normalizan con operaciones
+vectorizadas de pandas y el upsert va por lotes: executemany en SQLite y COPY a
+una tabla temporal en PostgreSQL, seguidos de un INSERT ... ON CONFLICT DO UPDATE.
+Los archivos subidos (XLSX o CSV) se leen por bloques, sin cargarlos completos.
+En modo sincronización cada fila lleva un content_hash y solo se escriben las
+altas, los cambios y las bajas (activo = FALSE) respecto a lo guardado.
+"""
+import hashlib
+import itertools
+import logging
+import os
+import unicodedata
+import uuid
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import pandas as pd
+
+from database import get_db_connection, is_sqlite, row_to_dict
+
+logger = logging.getLogger(__name__)
+
+# Nombres aceptados por campo (sin acentos ni mayúsculas), en orden de prioridad
+COLUMN_ALIASES = {
+    "matricula": ("matricula", "id"),
+    "nombre": ("nombre", "alumno"),
+    "carrera": ("carrera", "programa"),
+    "semestre": ("semestre", "sem"),
+    "email": ("email", "correo"),
+}
+
+STUDENT_FIELDS = ("matricula", "nombre", "carrera", "semestre", "email")
+
+# Filas por bloque al leer archivos subidos (cada bloque es un upsert)
+ROSTER_CHUNK_ROWS = int(os.getenv("ROSTER_CHUNK_ROWS", "5000"))
+# Errores por fila que se devuelven como máximo (se cuentan todos)
+ROSTER_MAX_ERRORS = int(os.getenv("ROSTER_MAX_ERRORS", "200"))
+# Matrículas listadas por tipo de cambio en el reporte de sincronización
+ROSTER_MAX_DIFF = int(os.getenv("ROSTER_MAX_DIFF", "1000"))
+
+_STAGING_COLUMNS = "id, matricula, nombre, carrera, semestre, email, content_hash"
+
+_STAGING_TABLE = '''
+    CREATE TEMP TABLE students_staging (
+        id TEXT,
+        matricula TEXT,
+        nombre TEXT,
+        carrera TEXT,
+        semestre INTEGER,
+        email TEXT,
+        content_hash TEXT
+    )
+'''
+
+# Un campo ausente en el padrón (NULL) no borra el valor que ya existía.
+# activo se enlaza como '1': PostgreSQL lo convierte a BOOLEAN y SQLite a INTEGER.
+_UPSERT_SET = '''
+    ON CONFLICT (matricula) DO UPDATE SET
+        nombre = excluded.nombre,
+        carrera = COALESCE(excluded.carrera, students.carrera),
+        semestre = COALESCE(excluded.semestre, students.semestre),
+        email = COALESCE(excluded.email, students.email),
+        content_hash = excluded.content_hash,
+        activo = %s
+'''
+
+# WHERE true: SQLite necesita desambiguar el ON CONFLICT de un INSERT ... SELECT.
+_UPSERT_SQL = f'''
+    INSERT INTO students ({_STAGING_COLUMNS})
+    SELECT {_STAGING_COLUMNS} FROM students_staging
+    WHERE true
+    {_UPSERT_SET}
+'''
+
+# Sincronización: solo las filas nuevas, cambiadas o que vuelven a estar activas
+_SYNC_UPSERT_SQL = f'''
+    INSERT INTO students ({_STAGING_COLUMNS})
+    SELECT {_STAGING_COLUMNS} FROM students_staging s
+    WHERE NOT EXISTS (
+        SELECT 1 FROM students st
+        WHERE st.matricula = s.matricula AND st.content_hash = s.content_hash AND st.activo = %s
+    )
+    {_UPSERT_SET}
+'''
+
+_NEW_MATRICULAS_SQL = '''
+    SELECT s.matricula FROM students_staging s
+    WHERE NOT EXISTS (SELECT 1 FROM students st WHERE st.matricula = s.matricula)
+    ORDER BY s.matricula
+'''
+
+_CHANGED_MATRICULAS_SQL = '''
+    SELECT s.matricula FROM students_staging s
+    JOIN students st ON st.matricula = s.matricula
+    WHERE st.content_hash IS NULL OR st.content_hash <> s.content_hash OR st.activo = %s
+    ORDER BY s.matricula
+'''
+
+_MISSING_MATRICULAS_SQL = '''
+    SELECT st.matricula FROM students st
+    WHERE st.activo = %s
+      AND NOT EXISTS (SELECT 1 FROM students_staging s WHERE s.matricula = st.matricula)
+    ORDER BY st.matricula
+'''
+
+_DEACTIVATE_SQL = '''
+    UPDATE students SET activo = %s
+    WHERE activo = %s
+      AND NOT EXISTS (SELECT 1 FROM students_staging s WHERE s.matricula = students.matricula)
+'''
+
+def _column_key(name) -> str:
+    text = unicodedata.normalize("NFKD", str(name)).encode("ascii", "ignore").decode("ascii")
+    return text.strip().lower()
+
+def resolve_columns(columns) -> Dict[str, str]:
+    """Relaciona cada campo con la columna del archivo que lo contiene (campo -> columna)."""
+    by_key = {}
+    for column in columns:
+        by_key.setdefault(_column_key(column), column)
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in by_key:
+                mapping[field] = by_key[alias]
+                break
+    return mapping
+
+def _text(series: pd.Series) -> pd.Series:
+    was_float = pd.api.types.is_float_dtype(series)
+    text = series.astype("string").str.strip()
+    if was_float:
+        # Excel entrega las matrículas numéricas como float: 12345.0 -> 12345
+        text = text.str.replace(r"\.0$", "", regex=True)
+    return text.replace("", pd.NA)
+
+def _integer(series: pd.Series) -> pd.Series:
+    numbers = pd.to_numeric(series, errors="coerce")
+    return numbers.where(numbers % 1 == 0).astype("Int64")
+
+def content_hashes(students: pd.DataFrame) -> pd.Series:
+    """Huella SHA-1 de los campos normalizados de cada estudiante (detecta cambios)."""
+    joined = students["matricula"].astype("string")
+    for field in STUDENT_FIELDS[1:]:
+        joined = joined.str.cat(students[field].astype("string").fillna(""), sep="\x1f")
+    return pd.Series(
+        [hashlib.sha1(value.encode("utf-8")).hexdigest() for value in joined],
+        index=students.index, dtype="string"
+    )
+
+def normalize_roster(df: pd.DataFrame, mapping: Optional[Dict[str, str]] = None) -> Tuple[pd.DataFrame, dict]:
+    """Convierte el DataFrame del archivo a las columnas de students.
+
+    El índice de df se toma como número de fila del archivo para reportar errores.
+    Devuelve (estudiantes, resumen); las filas sin matrícula se omiten y, si una
+    matrícula se repite, gana la última fila.
+    """
+    if mapping is None:
+        mapping = resolve_columns(df.columns)
+    if "matricula" not in mapping:
+        raise ValueError(f"No se encontró la columna de matrícula. Columnas: {list(df.columns)}")
+
+    students = pd.DataFrame(index=df.index)
+    for field in STUDENT_FIELDS:
+        if field not in mapping:
+            students[field] = pd.Series(pd.NA, index=df.index, dtype="Int64" if field == "semestre" else "string")
+        elif field == "semestre":
+            students[field] = _integer(df[mapping[field]])
+        else:
+            students[field] = _text(df[mapping[field]])
+
+    errors = []
+    without_matricula = students["matricula"].isna()
+    errors += [{"row": int(row), "error": "Sin matrícula"} for row in students.index[without_matricula]]
+    if "semestre" in mapping:
+        # Semestre con valor que no es un entero: se importa la fila sin semestre
+        invalid = students["semestre"].isna() & _text(df[mapping["semestre"]]).notna() & ~without_matricula
+        errors += [
+            {"row": int(row), "error": f"Semestre inválido: {df.at[row, mapping['semestre']]}"}
+            for row in students.index[invalid]
+        ]
+
+    students = students[~without_matricula].copy()
+    # Si no hay nombre, usar "Estudiante [Matrícula]"
+    students["nombre"] = students["nombre"].fillna("Estudiante " + students["matricula"])
+
+    repeated = students["matricula"].duplicated(keep="last")
+    errors += [
+        {"row": int(row), "error": "Matrícula repetida, se usa la última fila"}
+        for row in students.index[repeated]
+    ]
+    students = students[~repeated].copy()
+    students["content_hash"] = content_hashes(students)
+
+    summary = {
+        "rows": len(df),
+        "skipped": int(without_matricula.sum()),
+        "duplicates": int(repeated.sum()),
+        "columns": mapping,
+        "errors": sorted(errors, key=lambda error: error["row"]),
+    }
+    return students.reset_index(drop=True), summary
+
+def _records(students: pd.DataFrame) -> Iterator[tuple]:
+    """Filas (id, matricula, ..., content_hash) con None en lugar de NA; id nuevo por si se inserta."""
+    values = students[[*STUDENT_FIELDS, "content_hash"]].astype(object)
+    values = values.where(values.notna(), None)
+    for row in values.itertuples(index=False, name=None):
+        yield (str(uuid.uuid4()), *row)
+
+def _load_staging(cursor, conn, students: pd.DataFrame):
+    """Carga los estudiantes en la tabla temporal students_staging."""
+    if is_sqlite(conn):
+        # La conexión del hilo se reutiliza: no dejar una tabla temporal de otra importación
+        cursor.execute("DROP TABLE IF EXISTS temp.students_staging")
+        cursor.execute(_STAGING_TABLE)
+        cursor.executemany(
+            f"INSERT INTO students_staging ({_STAGING_COLUMNS}) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+            _records(students)
+        )
+    else:
+        cursor.execute(_STAGING_TABLE + " ON COMMIT DROP")
+        with cursor.copy(f"COPY students_staging ({_STAGING_COLUMNS}) FROM STDIN") as copy:
+            for record in _records(students):
+                copy.write_row(record)
+
+def _drop_staging(cursor, conn):
+    if is_sqlite(conn):
+        cursor.execute("DROP TABLE temp.students_staging")
+
+def _matriculas(cursor, query, params=()):
+    cursor.execute(query, params)
+    return [row_to_dict(row)["matricula"] for row in cursor.fetchall()]
+
+def upsert_students(students: pd.DataFrame) -> dict:
+    """Inserta o actualiza los estudiantes en una sola transacción.
+
+    Devuelve {"inserted": n, "updated": m}.
+    """
+    if students.empty:
+        return {"inserted": 0, "updated": 0}
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        _load_staging(cursor, conn, students)
+
+        cursor.execute('''
+            SELECT COUNT(*) AS count
+            FROM students_staging s
+            JOIN students ON students.matricula = s.matricula
+        ''')
+        updated = int(row_to_dict(cursor.fetchone())["count"])
+
+        cursor.execute(_UPSERT_SQL, ('1',))
+        _drop_staging(cursor, conn)
+
+    logger.info(f"Padrón importado: {len(students) - updated} nuevos, {updated} actualizados")
+    return {"inserted": len(students) - updated, "updated": updated}
+
+def sync_students(students: pd.DataFrame, deactivate_missing: bool = False, dry_run: bool = False) -> dict:
+    """Sincronización incremental contra el padrón completo.
+
+    Compara content_hash y solo escribe altas, cambios y reactivaciones; solo con
+    deactivate_missing (opt-in explícito) marca activo = FALSE a quien ya no aparece. Con dry_run
+    calcula las diferencias sin escribir. Devuelve las matrículas por tipo de cambio.
+    """
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        _load_staging(cursor, conn, students)
+
+        inserted = _matriculas(cursor, _NEW_MATRICULAS_SQL)
+        updated = _matriculas(cursor, _CHANGED_MATRICULAS_SQL, ('0',))
+        deactivated = _matriculas(cursor, _MISSING_MATRICULAS_SQL, ('1',)) if deactivate_missing else []
+
+        if not dry_run:
+            if inserted or updated:
+                cursor.execute(_SYNC_UPSERT_SQL, ('1', '1'))
+            if deactivated:
+                cursor.execute(_DEACTIVATE_SQL, ('0', '1'))
+        _drop_staging(cursor, conn)
+
+    if not dry_run:
+        logger.info(
+            f"Padrón sincronizado: {len(inserted)} nuevos, {len(updated)} cambiados, "
+            f"{len(deactivated)} dados de baja"
+        )
+    return {"inserted": inserted, "updated": updated, "deactivated": deactivated}
+
+def import_roster_chunks(chunks: Iterable[pd.DataFrame]) -> dict:
+    """Importa un padrón bloque por bloque (un upsert por bloque).
+
+    Las columnas se resuelven con el primer bloque y las matrículas repetidas se
+    detectan dentro de cada bloque (entre bloques la última simplemente actualiza).
+    Devuelve los totales y hasta ROSTER_MAX_ERRORS errores por fila.
+    """
+    result = {
+        "rows": 0, "inserted": 0, "updated": 0, "skipped": 0, "duplicates": 0,
+        "columns": None, "errors": [], "error_count": 0
+    }
+    for chunk in chunks:
+        if result["columns"] is None:
+            result["columns"] = resolve_columns(chunk.columns)
+        students, summary = normalize_roster(chunk, result["columns"])
+        counts = upsert_students(students)
+        for key in ("rows", "skipped", "duplicates"):
+            result[key] += summary[key]
+        result["inserted"] += counts["inserted"]
+        result["updated"] += counts["updated"]
+        result["error_count"] += len(summary["errors"])
+        room = ROSTER_MAX_ERRORS - len(result["errors"])
+        result["errors"] += summary["errors"][:max(room, 0)]
+    if result["columns"] is None:
+        raise ValueError("El archivo no tiene filas")
+    return result
+
+def sync_roster_chunks(chunks: Iterable[pd.DataFrame], deactivate_missing: bool = False,
+                       dry_run: bool = False) -> dict:
+    """Sincroniza el padrón completo leído por bloques (ver sync_students).
+
+    Los bloques se normalizan uno a uno y la comparación se hace una sola vez,
+    porque las bajas solo pueden calcularse con el padrón entero.
+    """
+    result = {
+        "rows": 0, "skipped": 0, "duplicates": 0, "columns": None,
+        "errors": [], "error_count": 0, "dry_run": dry_run
+    }
+    frames = []
+    for chunk in chunks:
+        if result["columns"] is None:
+            result["columns"] = resolve_columns(chunk.columns)
+        students, summary = normalize_roster(chunk, result["columns"])
+        frames.append(students)
+        for key in ("rows", "skipped", "duplicates"):
+            result[key] += summary[key]
+        result["error_count"] += len(summary["errors"])
+        room = ROSTER_MAX_ERRORS - len(result["errors"])
+        result["errors"] += summary["errors"][:max(room, 0)]
+
+    students = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+    if students.empty:
+        # Sin esta validación un archivo vacío daría de baja a todos los estudiantes
+        raise ValueError("El padrón no tiene estudiantes válidos")
+    total = len(students)
+    students = students.drop_duplicates("matricula", keep="last")
+    result["duplicates"] += total - len(students)
+
+    changes = sync_students(students, deactivate_missing, dry_run)
+    result.update({
+        "inserted": len(changes["inserted"]),
+        "updated": len(changes["updated"]),
+        "deactivated": len(changes["deactivated"]),
+        "unchanged": len(students) - len(changes["inserted"]) - len(changes["updated"]),
+        "changes": {kind: matriculas[:ROSTER_MAX_DIFF] for kind, matriculas in changes.items()},
+    })
+    return result
+
+def import_roster(df: pd.DataFrame) -> dict:
+    """Normaliza y guarda un padrón leído completo con pandas (fila 1 = encabezados)."""
+    return import_roster_chunks([df.set_axis(range(2, len(df) + 2))])
+
+# ==================== LECTURA POR BLOQUES ====================
+
+def _csv_format(file) -> Tuple[str, str]:
+    """(encoding, separador) a partir de la muestra inicial del archivo.
+
+    UTF-8 si la muestra decodifica, si no Latin-1; ';' si el encabezado lo usa
+    (Excel en español guarda así los CSV).
+    """
+    sample = file.read(1024 * 1024)
+    file.seek(0)
+    encoding = "utf-8-sig"
+    try:
+        text = sample.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # Un carácter multibyte cortado al final de la muestra no cuenta
+        if e.start < len(sample) - 3:
+            encoding = "latin-1"
+        text = sample[:e.start].decode("utf-8") if encoding != "latin-1" else sample.decode("latin-1")
+    header = text.splitlines()[0] if text else ""
+    separator = ";" if header.count(";") > header.count(",") else ","
+    return encoding, separator
+
+def _csv_chunks(file, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    encoding, separator = _csv_format(file)
+    # dtype=str: las matrículas conservan ceros a la izquierda
+    reader = pd.read_csv(file, dtype=str, chunksize=chunk_rows, encoding=encoding, sep=separator)
+    for chunk in reader:
+        yield chunk.set_axis(chunk.index + 2)
+
+def _xlsx_chunks(file, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    from openpyxl import load_workbook
+
+    # read_only: openpyxl recorre la hoja sin cargarla completa
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) if name is not None else f"columna_{i + 1}" for i, name in enumerate(header)]
+        width = len(columns)
+        numbered = enumerate(rows, start=2)
+        while True:
+            block = list(itertools.islice(numbered, chunk_rows))
+            if not block:
+                break
+            data = [
+                (number, (tuple(values) + (None,) * width)[:width])
+                for number, values in block
+                if any(value is not None for value in values)
+            ]
+            if data:
+                yield pd.DataFrame(
+                    [values for _, values in data], columns=columns,
+                    index=[number for number, _ in data]
+                ).infer_objects()
+    finally:
+        workbook.close()
+
+def read_roster_chunks(file, filename: str, chunk_rows: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Lee un padrón XLSX o CSV en bloques de chunk_rows filas.
+
+    El índice de cada bloque es el número de fila en el archivo.
+    """
+    chunk_rows = chunk_rows or ROSTER_CHUNK_ROWS
+    extension = os.path.splitext(filename or "")[1].lower()
+    if extension == ".csv":
+        return _csv_chunks(file, chunk_rows)
+    if extension in (".xlsx", ".xlsm"):
+        return _xlsx_chunks(file, chunk_rows)
+    raise ValueError("Formato no soportado: use un archivo .xlsx o .csv")
@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, status, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr
 from typing import Optional
 from datetime import datetime, timedelta, timezone
@@ -8,7 +9,8 @@ import sys
 import os
 from dotenv import load_dotenv
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database import get_connection, row_to_dict, rows_to_list, init_database
+from database import DatabaseBusyError, configure, get_connection, release_connection, row_to_dict, rows_to_list, init_database
+from auth import push_token_revocation
 import uuid
 import jwt
 import bcrypt
@@ -19,6 +21,9 @@ app = FastAPI(title="Users Service - Sistema de Asistencias")
 ENV_PATH = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", ".env"))
 load_dotenv(dotenv_path=ENV_PATH)
 
+# Parámetros de pool y conexión propios de este servicio (USERS_DB_*)
+configure(service="users")
+
 # Configurar CORS dinámicamente
 allowed_origins_str = os.getenv("ALLOWED_ORIGINS", "*")
 if allowed_origins_str == "*":
@@ -34,12 +39,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Pool de base de datos agotado: 503 para que el cliente reintente, en lugar de abrir más conexiones
+@app.exception_handler(DatabaseBusyError)
+async def database_busy_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": "Base de datos ocupada, intenta de nuevo"},
+        headers={"Retry-After": "1"}
+    )
+
 security = HTTPBearer()
 
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 480
 
+# Servicios que cachean tokens verificados y deben enterarse de un cambio de contraseña
+TOKEN_CACHE_SERVICES = [
+    os.getenv("EVENTS_SERVICE_URL", "http://localhost:8102"),
+    os.getenv("REPORTS_SERVICE_URL", "http://localhost:8103")
+]
+
 # Inicializar base de datos solo en SQLite (en Postgres se asume gestionado en migración)
 if not os.getenv("DATABASE_URL", "").startswith("postgres"):
     init_database()
@@ -101,7 +121,7 @@ def ensure_default_users():
             )
     
     conn.commit()
-    conn.close()
+    release_connection(conn)
 
 # Asegurar usuarios por defecto (solo cuando se usa SQLite)
 if not os.getenv("DATABASE_URL", "").startswith("postgres"):
@@ -132,6 +152,10 @@ def decode_token(token: str):
             detail="Token inválido"
         )
 
+def token_version_matches(payload: dict, token_version) -> bool:
+    """El claim tv debe coincidir con users.token_version (tokens sin tv = versión 0)."""
+    return int(payload.get("tv") or 0) == int(token_version or 0)
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = decode_token(token)
@@ -146,7 +170,7 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
     user = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     
     if user is None:
         raise HTTPException(
@@ -154,7 +178,13 @@ def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(securit
             detail="Usuario no encontrado"
         )
     
-    return row_to_dict(user)
+    user = row_to_dict(user)
+    if not token_version_matches(payload, user.get("token_version")):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revocado"
+        )
+    return user
 
 @app.post("/api/users/register", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 def register_user(user: UserCreate):
@@ -164,7 +194,7 @@ def register_user(user: UserCreate):
     # Verificar username
     cursor.execute("SELECT id FROM users WHERE username = %s", (user.username,))
     if cursor.fetchone():
-        conn.close()
+        release_connection(conn)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El nombre de usuario ya existe"
@@ -173,7 +203,7 @@ def register_user(user: UserCreate):
     # Verificar email
     cursor.execute("SELECT id FROM users WHERE email = %s", (user.email,))
     if cursor.fetchone():
-        conn.close()
+        release_connection(conn)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="El correo electrónico ya está registrado"
@@ -191,7 +221,7 @@ def register_user(user: UserCreate):
     
     cursor.execute("SELECT * FROM users WHERE id = %s", (user_id,))
     new_user = row_to_dict(cursor.fetchone())
-    conn.close()
+    release_connection(conn)
     
     del new_user['password']
     return new_user
@@ -202,7 +232,7 @@ def login(user_login: UserLogin):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM users WHERE username = %s", (user_login.username,))
     user_row = cursor.fetchone()
-    conn.close()
+    release_connection(conn)
     
     if not user_row:
         raise HTTPException(
@@ -235,7 +265,7 @@ def login(user_login: UserLogin):
     
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
-        data={"sub": user["id"], "username": user["username"], "role": user["role"]},
+        data={"sub": user["id"], "username": user["username"], "role": user["role"], "tv": user.get("token_version") or 0},
         expires_delta=access_token_expires
     )
     
@@ -252,14 +282,14 @@ def get_current_user_info(current_user: dict = Depends(get_current_user)):
     return user_response
 
 @app.put("/api/users/me", response_model=UserResponse)
-def update_current_user(user_update: UserUpdate, current_user: dict = Depends(get_current_user)):
+def update_current_user(user_update: UserUpdate, background_tasks: BackgroundTasks, current_user: dict = Depends(get_current_user)):
     conn = get_connection()
     cursor = conn.cursor()
     
     if user_update.email:
         cursor.execute("SELECT id FROM users WHERE email = %s AND id != %s", (user_update.email, current_user["id"]))
         if cursor.fetchone():
-            conn.close()
+            release_connection(conn)
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="El correo electrónico ya está en uso"
@@ -269,15 +299,25 @@ def update_current_user(user_update: UserUpdate, current_user: dict = Depends(ge
     if user_update.full_name:
         cursor.execute("UPDATE users SET full_name = %s WHERE id = %s", (user_update.full_name, current_user["id"]))
     
+    token_version = None
     if user_update.password:
         hashed = hash_password(user_update.password)
-        cursor.execute("UPDATE users SET password = %s WHERE id = %s", (hashed, current_user["id"]))
+        # Nueva versión: los tokens emitidos antes del cambio dejan de ser válidos
+        cursor.execute(
+            "UPDATE users SET password = %s, token_version = token_version + 1 WHERE id = %s RETURNING token_version",
+            (hashed, current_user["id"])
+        )
+        token_version = row_to_dict(cursor.fetchone())["token_version"]
     
     conn.commit()
     
+    if token_version is not None:
+        # Avisar a los demás servicios (descartan cache y tokens de versiones anteriores)
+        background_tasks.add_task(push_token_revocation, current_user["id"], token_version, TOKEN_CACHE_SERVICES)
+    
     cursor.execute("SELECT * FROM users WHERE id = %s", (current_user["id"],))
     updated_user = row_to_dict(cursor.fetchone())
-    conn.close()
+    release_connection(conn)
     
     del updated_user['password']
     return updated_user
@@ -286,6 +326,18 @@ def update_current_user(user_update: UserUpdate, current_user: dict = Depends(ge
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token = credentials.credentials
     payload = decode_token(token)
+    
+    conn = get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT token_version FROM users WHERE id = %s", (payload.get("sub"),))
+    user = cursor.fetchone()
+    release_connection(conn)
+    if user is None or not token_version_matches(payload, row_to_dict(user)["token_version"]):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token revocado"
+        )
+    
     return {
         "valid": True, 
         "user_id": payload.get("sub"), 
@@ -306,7 +358,7 @@ def health_check():
         cursor = conn.cursor()
         cursor.execute("SELECT 1")
         cursor.fetchone()
-        conn.close()
+        release_connection(conn)
         
         db_type = "PostgreSQL" if os.getenv("DATABASE_URL", "").startswith("postgres") else "SQLite"
         
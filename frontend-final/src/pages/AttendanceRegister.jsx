@@ -39,26 +39,20 @@ function AttendanceRegister() {
 
     setLoading(true);
     try {
-      // Buscar estudiante en la BD
-      let studentInfo = null;
-      try {
-        const studentRes = await axios.get(`/students/search/${barcode}`);
-        studentInfo = studentRes.data;
-      } catch (err) {
-        // Estudiante no encontrado en BD, continuar sin info
-      }
-
-      // Registrar asistencia
-      const response = await axios.post("/attendances", {
+      // Búsqueda del estudiante y registro en una sola petición
+      const response = await axios.post("/attendances/scan", {
         id_credencial: barcode,
         id_evento: id,
       });
+      const attendance = response.data;
+      const studentInfo = attendance.estudiante;
 
       setLastScanned({
         matricula: barcode,
         nombre: studentInfo?.nombre || "Desconocido",
         carrera: studentInfo?.carrera || "",
         semestre: studentInfo?.semestre || "",
+        preRegistrado: attendance.pre_registrado,
         timestamp: new Date().toLocaleString(),
       });
 
@@ -66,7 +60,8 @@ function AttendanceRegister() {
         type: "success",
         text: `Asistencia registrada: ${studentInfo?.nombre || barcode}`,
       });
-      await loadEventData();
+      // La respuesta ya trae la asistencia completa: no recargar el evento en cada escaneo
+      setAttendances((prev) => [attendance, ...prev]);
     } catch (error) {
       console.error("Error al registrar:", error.response?.data);
       const errorMsg =
@@ -136,6 +131,10 @@ function AttendanceRegister() {
               <p>
                 <strong>Semestre:</strong> {lastScanned.semestre}
               </p>
+              <p>
+                <strong>Pre-registro:</strong>{" "}
+                {lastScanned.preRegistrado ? "Sí" : "No"}
+              </p>
             </div>
           </div>
         )}
@@ -2,6 +2,8 @@ import { useState, useEffect } from "react";
 import axios from "axios";
 import "./Reports.css";
 
+const PAGE_SIZE = 50;
+
 function Reports() {
   const [filters, setFilters] = useState({
     event_id: "",
@@ -11,6 +13,8 @@ function Reports() {
     search_term: "",
   });
   const [attendances, setAttendances] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [totalAttendances, setTotalAttendances] = useState(0);
   const [events, setEvents] = useState([]);
   const [eventStats, setEventStats] = useState(null);
   const [loading, setLoading] = useState(false);
@@ -32,22 +36,35 @@ function Reports() {
     fetchEvents();
   }, []);
 
+  const buildFilters = () => {
+    // Limpiar filtros vacios y convertir validado a boolean
+    const cleanFilters = {};
+    if (filters.event_id) cleanFilters.event_id = filters.event_id;
+    if (filters.fecha_inicio) cleanFilters.fecha_inicio = filters.fecha_inicio;
+    if (filters.fecha_fin) cleanFilters.fecha_fin = filters.fecha_fin;
+    if (filters.validado !== "")
+      cleanFilters.validado = filters.validado === "true";
+    if (filters.search_term) cleanFilters.search_term = filters.search_term;
+    return cleanFilters;
+  };
+
+  // Paginación en el servidor: se piden PAGE_SIZE filas y el cursor de la siguiente página
+  const fetchAttendancesPage = async (cursor) => {
+    const body = { ...buildFilters(), limit: PAGE_SIZE };
+    if (cursor) body.cursor = cursor;
+    else body.include_total = true;
+    const response = await axios.post("/reports/attendances/page", body);
+    return response.data;
+  };
+
   const handleSearch = async () => {
     setLoading(true);
     setEventStats(null);
     try {
-      // Limpiar filtros vacios y convertir validado a boolean
-      const cleanFilters = {};
-      if (filters.event_id) cleanFilters.event_id = parseInt(filters.event_id);
-      if (filters.fecha_inicio)
-        cleanFilters.fecha_inicio = filters.fecha_inicio;
-      if (filters.fecha_fin) cleanFilters.fecha_fin = filters.fecha_fin;
-      if (filters.validado !== "")
-        cleanFilters.validado = filters.validado === "true";
-      if (filters.search_term) cleanFilters.search_term = filters.search_term;
-
-      const response = await axios.post("/reports/attendances", cleanFilters);
-      setAttendances(response.data);
+      const page = await fetchAttendancesPage(null);
+      setAttendances(page.items);
+      setNextCursor(page.next_cursor);
+      setTotalAttendances(page.total ?? page.items.length);
     } catch (error) {
       console.error("Error al generar reporte:", error);
       alert(
@@ -59,6 +76,24 @@ function Reports() {
     }
   };
 
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setLoading(true);
+    try {
+      const page = await fetchAttendancesPage(nextCursor);
+      setAttendances((prev) => [...prev, ...page.items]);
+      setNextCursor(page.next_cursor);
+    } catch (error) {
+      console.error("Error al cargar más asistencias:", error);
+      alert(
+        "Error al cargar más asistencias: " +
+          (error.response?.data?.detail || error.message)
+      );
+    } finally {
+      setLoading(false);
+    }
+  };
+
   const handleEventReport = async () => {
     if (!filters.event_id) {
       alert("Por favor selecciona un evento");
@@ -96,6 +131,7 @@ function Reports() {
         attendances_list: eventAttendances, // Guardar lista de asistencias
       });
       setAttendances([]);
+      setNextCursor(null);
     } catch (error) {
       console.error("Error al generar reporte del evento:", error);
       alert(
@@ -325,7 +361,9 @@ function Reports() {
 
       {attendances.length > 0 && (
         <div className="results-section">
-          <h2>Resultados: {attendances.length} asistencias</h2>
+          <h2>
+            Resultados: {attendances.length} de {totalAttendances} asistencias
+          </h2>
           <table>
             <thead>
               <tr>
@@ -354,6 +392,13 @@ function Reports() {
               ))}
             </tbody>
           </table>
+          {nextCursor && (
+            <div className="actions-row">
+              <button onClick={handleLoadMore} disabled={loading}>
+                {loading ? "Cargando..." : "Cargar más"}
+              </button>
+            </div>
+          )}
         </div>
       )}
 